@@ -1,7 +1,8 @@
 from math import sqrt
 import numpy as np
 from functools import partial
-from utils import regret_of_variable 
+from utils import regret_objective
+import instrumentation
 
 # Amoeba uses the simplex method of Nelder and Mead to maximize a
 # function of 1 or more variables, constraints are put into place
@@ -32,7 +33,7 @@ def shrink_simplex(sorted_simplex, sorted_value, func, rho = 0.5):
         fvalue.append(func(simplex[i]))
     return simplex, fvalue 
 
-def amoeba_mrcp(empirical_game, full_game, var='uni', max_iter=5000, ftolerance=1.e-4, xtolerance=1.e-4):
+def amoeba_mrcp(empirical_game, full_game, var='uni', max_iter=5000, ftolerance=1.e-4, xtolerance=1.e-4, rng=None):
     """
     Note each varibale in the amoeba variable is two times the length of the strategies
     Input:
@@ -42,6 +43,8 @@ def amoeba_mrcp(empirical_game, full_game, var='uni', max_iter=5000, ftolerance=
         max_iter       : maximum iteration of amoeba to automatically end
         ftolerance     : smallest difference of best and worst vertex to converge
         xtolerance     : smallest difference in average point and worst point of simplex
+        rng            : a np.random.Generator random initial points are drawn from,
+                         the global np.random if None
     """
     def normalize(sections, variables):
         """
@@ -60,17 +63,16 @@ def amoeba_mrcp(empirical_game, full_game, var='uni', max_iter=5000, ftolerance=
             pointer = ele
         return variables
 
-    # construct function for query
-    func = partial(regret_of_variable,
-            empirical_games=empirical_game,
-            meta_game=full_game) 
+    # construct function for query, slicing the full game once per call
+    func = instrumentation.counted(regret_objective(empirical_game, full_game), 'amoeba_evaluations')
+    instrumentation.count('amoeba_restarts')
 
     sections = [len(ele) for ele in empirical_game]    # num strategies for players
     normalize = partial(normalize, sections=sections)  # force into simplex
     if var=='uni':
         var = np.ones(sum(sections))      # the initial point of search from uniform
     elif var=='rand': # random initial points
-        var = np.random.rand(sum(sections))
+        var = np.random.rand(sum(sections)) if rng is None else rng.random(sum(sections))
     else:
         assert len(var) == sum(sections), 'initial points incorrect shape'
 
@@ -194,3 +196,165 @@ def amoeba_mrcp(empirical_game, full_game, var='uni', max_iter=5000, ftolerance=
     fvalue = [fvalue[ele] for ele in sort_index]
     simplex = [simplex[ele] for ele in sort_index]
     return np.split(simplex[0],sections[:-1]), fvalue[0], iteration
+
+def amoeba_mrcp_batch(empirical_game, full_game, num_restarts=100, var='rand', max_iter=5000, ftolerance=1.e-4, xtolerance=1.e-4, rng=None):
+    """
+    Run num_restarts amoebas of amoeba_mrcp at once. All simplexes are kept in
+    one (R, nvar+1, nvar) array and advanced together, every step evaluates
+    the objective on a whole stack of points, and restarts that converged are
+    retired from the arrays. Each restart makes the same moves as amoeba_mrcp
+    from the same initial point, and random initial points are drawn in the
+    same order as num_restarts serial calls.
+    Input:
+        empirical_game : each player's strategy set
+        full_game      : the full meta game to compute mrcp on
+        num_restarts   : number of amoebas R
+        var            : 'uni', 'rand' or a (R, nvar) array of initial points
+        max_iter       : maximum iteration of amoeba to automatically end
+        ftolerance     : smallest difference of best and worst vertex to converge
+        xtolerance     : smallest difference in average point and worst point of simplex
+        rng            : a np.random.Generator random initial points are drawn from,
+                         the global np.random if None
+    Output:
+        the best restart's profile, value and iteration, as in amoeba_mrcp
+    """
+    func = instrumentation.counted(regret_objective(empirical_game, full_game), 'amoeba_evaluations')
+    instrumentation.count('amoeba_restarts', num_restarts)
+    sections = [len(ele) for ele in empirical_game]
+    bounds = np.cumsum([0] + sections)
+
+    def normalize(variables):
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            variables[..., start:end] /= np.sum(variables[..., start:end], axis=-1, keepdims=True)
+        return variables
+
+    def within_probability_simplex(points):
+        return np.all(points >= 0, axis=-1) & np.all(points <= 1, axis=-1)
+
+    nvar = sum(sections)
+    nsimplex = nvar + 1
+    if isinstance(var, str) and var == 'uni':
+        var = np.ones((num_restarts, nvar))
+    elif isinstance(var, str) and var == 'rand':
+        var = np.random.rand(num_restarts, nvar) if rng is None else rng.random((num_restarts, nvar))
+    else:
+        var = np.array(var, dtype=float)
+        assert var.shape == (num_restarts, nvar), 'initial points incorrect shape'
+    var = normalize(var)
+
+    # same initial simplex as amoeba_mrcp for every restart
+    c = 1
+    val_b = c/nvar/sqrt(2)*(sqrt(nvar+1)-1)
+    val_a = val_b + c/sqrt(2)
+    simplex = np.empty((num_restarts, nsimplex, nvar))
+    simplex[:, 0] = var
+    simplex[:, 1:] = normalize(var[:, None, :] + val_b + (val_a-val_b)*np.eye(nvar))
+    fvalue = func(simplex.reshape(-1, nvar)).reshape(num_restarts, nsimplex)
+
+    restart = np.arange(num_restarts)   # restart each active row belongs to
+    best_var = np.empty((num_restarts, nvar))
+    best_value = np.empty(num_restarts)
+    best_iteration = np.empty(num_restarts, dtype=int)
+
+    def retire(mask, iteration):
+        best_var[restart[mask]] = simplex[mask, 0]
+        best_value[restart[mask]] = fvalue[mask, 0]
+        best_iteration[restart[mask]] = iteration
+
+    iteration = 0
+    while iteration < max_iter and len(restart) > 0:
+        # sort the simplexes and the fvalues, the last one is the worst
+        sort_index = np.argsort(fvalue, axis=1)
+        fvalue = np.take_along_axis(fvalue, sort_index, axis=1)
+        simplex = np.take_along_axis(simplex, sort_index[:, :, None], axis=1)
+
+        # get the average of the n points except from the worst
+        x_a = np.average(simplex[:, :-1], axis=1)
+        assert np.all(within_probability_simplex(x_a)), 'centroid not in probability simplex'
+        worst = simplex[:, -1]
+
+        # termination criteria as amoeba_mrcp, per restart
+        simscale = np.sum(np.absolute(x_a-worst), axis=1)/nvar
+        fscale = (np.absolute(fvalue[:, 0])+np.absolute(fvalue[:, -1]))/2.0
+        frange = np.zeros(len(restart))
+        nonzero = fscale != 0.0
+        frange[nonzero] = np.absolute(fvalue[nonzero, 0]-fvalue[nonzero, -1])/fscale[nonzero]
+        converged = (ftolerance <= 0.0 or frange < ftolerance) & (xtolerance <= 0.0 or simscale < xtolerance)
+        if np.any(converged):
+            retire(converged, iteration)
+            keep = ~converged
+            restart, simplex, fvalue = restart[keep], simplex[keep], fvalue[keep]
+            x_a, worst = x_a[keep], simplex[:, -1]
+            if len(restart) == 0:
+                break
+
+        # reflection, halving alpha until every point is within the simplex
+        alpha = np.ones((len(restart), 1))
+        x_r = x_a + alpha*(x_a-worst)
+        outside = ~within_probability_simplex(x_r)
+        while np.any(outside):
+            alpha[outside] /= 2
+            x_r[outside] = x_a[outside] + alpha[outside]*(x_a[outside]-worst[outside])
+            outside = ~within_probability_simplex(x_r)
+        f_r = func(x_r)
+
+        expand = f_r < fvalue[:, 0]
+        reflect = ~expand & (f_r < fvalue[:, -2])
+        inside = ~expand & ~reflect & (f_r > fvalue[:, -1])
+        outside = ~expand & ~reflect & ~inside
+        shrink = np.zeros(len(restart), dtype=bool)
+
+        # expansion if the reflection is better than the best
+        if np.any(expand):
+            idx = np.nonzero(expand)[0]
+            gamma = np.ones((len(idx), 1))
+            x_e = x_r[idx] + gamma*(x_r[idx]-x_a[idx])
+            out = ~within_probability_simplex(x_e)
+            while np.any(out):
+                gamma[out] /= 2
+                x_e[out] = x_r[idx[out]] + gamma[out]*(x_r[idx[out]]-x_a[idx[out]])
+                out = ~within_probability_simplex(x_e)
+            f_e = func(x_e)
+            accept = f_e < fvalue[idx, 0]
+            simplex[idx, -1] = np.where(accept[:, None], x_e, x_r[idx])
+            fvalue[idx, -1] = np.where(accept, f_e, f_r[idx])
+
+        # accept reflection when better than lousy
+        simplex[reflect, -1] = x_r[reflect]
+        fvalue[reflect, -1] = f_r[reflect]
+
+        # inside contract if reflection is worse than worst
+        if np.any(inside):
+            idx = np.nonzero(inside)[0]
+            x_c = x_a[idx] - 0.5*(x_a[idx]-worst[idx])
+            f_c = func(x_c)
+            accept = f_c < fvalue[idx, -1]
+            simplex[idx[accept], -1] = x_c[accept]
+            fvalue[idx[accept], -1] = f_c[accept]
+            shrink[idx[~accept]] = True
+
+        # outside contract if reflection better than worse
+        if np.any(outside):
+            idx = np.nonzero(outside)[0]
+            x_c = x_a[idx] + alpha[idx]*0.5*(x_a[idx]-worst[idx])
+            f_c = func(x_c)
+            accept = f_c < f_r[idx]
+            simplex[idx[accept], -1] = x_c[accept]
+            fvalue[idx[accept], -1] = f_c[accept]
+            shrink[idx[~accept]] = True
+
+        # shrink_simplex towards the best vertex
+        if np.any(shrink):
+            best = simplex[shrink, :1]
+            simplex[shrink, 1:] = best + 0.5*(simplex[shrink, 1:]-best)
+            fvalue[shrink, 1:] = func(simplex[shrink, 1:].reshape(-1, nvar)).reshape(-1, nvar)
+        iteration += 1
+
+    if len(restart) > 0:
+        sort_index = np.argsort(fvalue, axis=1)
+        fvalue = np.take_along_axis(fvalue, sort_index, axis=1)
+        simplex = np.take_along_axis(simplex, sort_index[:, :, None], axis=1)
+        retire(np.ones(len(restart), dtype=bool), iteration)
+
+    best = np.argmin(best_value)
+    return np.split(best_var[best], sections[:-1]), best_value[best], best_iteration[best]
@@ -0,0 +1,304 @@
+from game_generator import Game_generator
+from meta_strategies import double_oracle, fictitious_play, mrcp_solver
+from amoeba import amoeba_mrcp
+from utils import regret_of_variable, deviation_strategy, mixed_strategy_payoff
+import kernels
+from nash_solver.gambit_tools import encode_gambit_file, decode_gambit_file
+from nash_solver.replicator_dynamics_solver import replicator_dynamics
+
+from absl import app
+from absl import flags
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+"""
+Microbenchmarks of the solver and regret hot paths. Every function is timed on
+zero-sum and general-sum games from Game_generator for each game size and
+empirical game (support) size, results are written as json and can be compared
+against a stored baseline, e.g.
+    python benchmark.py --output=base.json
+    python benchmark.py --output=new.json --baseline=base.json
+"""
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_list("sizes", ["10", "100", "1000", "5000"], "Numbers of strategies of the full games.")
+flags.DEFINE_list("supports", ["2", "4", "8", "16", "32", "64"], "Numbers of strategies per player in the empirical game.")
+flags.DEFINE_list("game_types", ["zero_sum", "general_sum"], "Types of synthetic game.")
+flags.DEFINE_list("functions", None, "Functions to time, all if not given.")
+flags.DEFINE_integer("max_mrcp_support", 8, "Largest support on which mrcp_solver and amoeba_mrcp are timed.")
+flags.DEFINE_integer("rd_iterations", 1000, "Steps of replicator_dynamics per call.")
+flags.DEFINE_float("min_time", 0.2, "Keep repeating a call until this many seconds are spent on it.")
+flags.DEFINE_integer("max_repeats", 100, "Maximum number of timed calls per case.")
+flags.DEFINE_integer("seed", 0, "The seed of the generated games.")
+flags.DEFINE_string("output", "benchmark_results.json", "Where to write the results.")
+flags.DEFINE_string("baseline", None, "Results of an earlier run to compare against.")
+flags.DEFINE_float("threshold", 0.1, "Relative change of the median reported as slower or faster.")
+flags.DEFINE_list("imports", ["meta_strategies", "psro_trainer", "psro"], "Modules whose import time is measured and checked against IMPORT_BUDGETS.")
+flags.DEFINE_integer("import_repeats", 20, "Fresh interpreters each module import is timed in.")
+
+def empirical_game(num_strategies, support):
+    return [sorted(np.random.choice(num_strategies, support, replace=False).tolist()) for _ in range(2)]
+
+def random_profile(empirical_games, num_strategies=None):
+    """
+    A mixed strategy per player on the empirical game, full length if num_strategies is given.
+    """
+    probs = []
+    for idx in empirical_games:
+        prob = np.random.dirichlet(np.ones(len(idx)))
+        if num_strategies is not None:
+            full = np.zeros(num_strategies)
+            full[idx] = prob
+            prob = full
+        probs.append(prob)
+    return probs
+
+# Each setup builds its arguments once and returns the call to time.
+
+def setup_double_oracle(meta_games, empirical_games, scratch):
+    return lambda: double_oracle(meta_games, empirical_games, scratch + '/')
+
+def setup_fictitious_play(meta_games, empirical_games, scratch):
+    # fictitious play weights strategies by how often they were added
+    repeated = [idx + list(np.random.choice(idx, len(idx))) for idx in empirical_games]
+    return lambda: fictitious_play(meta_games, repeated, scratch + '/')
+
+def setup_mrcp_solver(meta_games, empirical_games, scratch):
+    def call():
+        if hasattr(mrcp_solver, "mrcp_calculator"):
+            mrcp_solver.mrcp_calculator.clear()
+        return mrcp_solver(meta_games, empirical_games)
+    return call
+
+def setup_amoeba_mrcp(meta_games, empirical_games, scratch):
+    return lambda: amoeba_mrcp(empirical_games, meta_games, var='rand')
+
+def setup_regret_of_variable(meta_games, empirical_games, scratch):
+    prob_var = np.concatenate(random_profile(empirical_games))
+    return lambda: regret_of_variable(prob_var, empirical_games, meta_games)
+
+def setup_deviation_strategy(meta_games, empirical_games, scratch):
+    probs = random_profile(empirical_games, meta_games[0].shape[0])
+    return lambda: deviation_strategy(meta_games, probs)
+
+def setup_batched_nashconv(meta_games, empirical_games, scratch):
+    # as many full-length profiles as strategies in the support, scored at once
+    probs = [np.stack(stack) for stack in zip(*[random_profile(empirical_games, meta_games[0].shape[0])
+                                                for _ in empirical_games[0]])]
+    return lambda: kernels.nashconv(meta_games, probs)
+
+def setup_mixed_strategy_payoff(meta_games, empirical_games, scratch):
+    subgames = [meta_game[np.ix_(*empirical_games)] for meta_game in meta_games]
+    probs = random_profile(empirical_games)
+    return lambda: mixed_strategy_payoff(subgames, probs)
+
+def setup_encode_gambit_file(meta_games, empirical_games, scratch):
+    subgames = [meta_game[np.ix_(*empirical_games)] for meta_game in meta_games]
+    return lambda: encode_gambit_file(subgames, checkpoint_dir=scratch)
+
+def setup_decode_gambit_file(meta_games, empirical_games, scratch):
+    subgames = [meta_game[np.ix_(*empirical_games)] for meta_game in meta_games]
+    # ten NE lines in the format gambit prints
+    probs = np.concatenate(random_profile(empirical_games))
+    with open(scratch + '/nfg/nash.txt', 'w') as f:
+        for _ in range(10):
+            f.write('NE,' + ','.join('{:.8f}'.format(p) for p in probs) + '\n')
+    return lambda: decode_gambit_file(subgames, mode="all", checkpoint_dir=scratch)
+
+def setup_replicator_dynamics(meta_games, empirical_games, scratch):
+    subgames = [meta_game[np.ix_(*empirical_games)].astype(float) for meta_game in meta_games]
+    return lambda: replicator_dynamics(subgames, prd_iterations=FLAGS.rd_iterations, prd_tolerance=None)
+
+BENCHMARKS = {'double_oracle': setup_double_oracle,
+              'fictitious_play': setup_fictitious_play,
+              'mrcp_solver': setup_mrcp_solver,
+              'amoeba_mrcp': setup_amoeba_mrcp,
+              'regret_of_variable': setup_regret_of_variable,
+              'deviation_strategy': setup_deviation_strategy,
+              'batched_nashconv': setup_batched_nashconv,
+              'mixed_strategy_payoff': setup_mixed_strategy_payoff,
+              'encode_gambit_file': setup_encode_gambit_file,
+              'decode_gambit_file': setup_decode_gambit_file,
+              'replicator_dynamics': setup_replicator_dynamics}
+
+# amoeba based, their cost explodes with the support
+MRCP_BENCHMARKS = ['mrcp_solver', 'amoeba_mrcp']
+
+def time_call(call, min_time, max_repeats):
+    """
+    Time call at least 3 times, then until min_time is spent or max_repeats reached.
+    Output:
+        a list of seconds per call
+    """
+    times = []
+    while len(times) < 3 or (sum(times) < min_time and len(times) < max_repeats):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return times
+
+# milliseconds a module may take to import on top of numpy, which every entry
+# point needs anyway. Heavy optional packages (pandas, matplotlib, process
+# pools, lrsnash helpers) are imported where they are used to stay within them.
+IMPORT_BUDGETS = {'meta_strategies': 40,
+                  'psro_trainer': 60,
+                  'psro': 100}
+
+def time_import(module):
+    """
+    Import module in a fresh interpreter after numpy.
+    Output:
+        seconds spent importing module and everything it pulls in besides numpy
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import numpy; import ' + module],
+                            cwd=os.path.dirname(os.path.realpath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True).stderr.decode()
+    # the last line is the module itself with its cumulative time in microseconds
+    return int(output.strip().splitlines()[-1].split('|')[1]) * 1e-6
+
+def run_imports(modules, repeats):
+    """
+    Time the import of every module and check it against its budget.
+    Output:
+        results in the format of run, number of modules over budget
+    """
+    results = []
+    num_over = 0
+    for module in modules:
+        times = [time_import(module) for _ in range(repeats)]
+        result = {'function': 'import ' + module,
+                  'game_type': '-',
+                  'size': 0,
+                  'support': 0,
+                  'repeats': len(times),
+                  'min': min(times),
+                  'median': float(np.median(times))}
+        budget = IMPORT_BUDGETS.get(module)
+        over = budget is not None and result['median'] * 1e3 > budget
+        num_over += over
+        print('{:22s} median {:.1f}ms min {:.1f}ms, budget {}{}'.format(
+            result['function'], result['median'] * 1e3, result['min'] * 1e3,
+            '-' if budget is None else '{}ms'.format(budget), ' OVER BUDGET' if over else ''))
+        results.append(result)
+    return results, num_over
+
+def case_key(result):
+    return (result['function'], result['game_type'], result['size'], result['support'])
+
+def run(functions, game_types, sizes, supports, scratch):
+    results = []
+    for game_type in game_types:
+        for size in sizes:
+            np.random.seed(FLAGS.seed)
+            generator = Game_generator(size)
+            meta_games = generator.zero_sum_game() if game_type == "zero_sum" else generator.general_sum_game()
+            for support in supports:
+                if support > size:
+                    continue
+                empirical_games = empirical_game(size, support)
+                for name in functions:
+                    if name in MRCP_BENCHMARKS and support > FLAGS.max_mrcp_support:
+                        continue
+                    np.random.seed(FLAGS.seed)
+                    call = BENCHMARKS[name](meta_games, empirical_games, scratch)
+                    # solvers print their progress, keep the output readable
+                    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+                    try:
+                        times = time_call(call, FLAGS.min_time, FLAGS.max_repeats)
+                    finally:
+                        sys.stdout.close()
+                        sys.stdout = stdout
+                    result = {'function': name,
+                              'game_type': game_type,
+                              'size': size,
+                              'support': support,
+                              'repeats': len(times),
+                              'min': min(times),
+                              'median': float(np.median(times))}
+                    print('{function:22s} {game_type:11s} size {size:5d} support {support:3d}: '
+                          'median {median:.3e}s min {min:.3e}s ({repeats} calls)'.format(**result))
+                    results.append(result)
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Print the cases whose median changed by more than threshold against baseline.
+    Output:
+        number of cases that got slower
+    """
+    base = {case_key(result): result for result in baseline['results']}
+    ratios = []
+    num_slower = 0
+    for result in results:
+        key = case_key(result)
+        if key not in base:
+            continue
+        ratio = result['median'] / base[key]['median']
+        ratios.append(ratio)
+        if ratio > 1 + threshold:
+            num_slower += 1
+            print('slower {:.2f}x: {} {} size {} support {}'.format(ratio, *key))
+        elif ratio < 1 / (1 + threshold):
+            print('faster {:.2f}x: {} {} size {} support {}'.format(1 / ratio, *key))
+    if ratios:
+        print('{} cases compared, geometric mean of new/baseline median time {:.3f}'.format(
+            len(ratios), np.exp(np.mean(np.log(ratios)))))
+    return num_slower
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.realpath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv):
+    if len(argv) > 1:
+        raise app.UsageError("Too many command-line arguments.")
+    functions = FLAGS.functions or list(BENCHMARKS)
+    for name in functions:
+        if name not in BENCHMARKS:
+            raise app.UsageError("unknown function {}, choose from {}".format(name, list(BENCHMARKS)))
+
+    scratch = tempfile.mkdtemp(prefix="benchmark_")
+    os.makedirs(scratch + '/nfg')
+    try:
+        results = run(functions,
+                      FLAGS.game_types,
+                      [int(size) for size in FLAGS.sizes],
+                      [int(support) for support in FLAGS.supports],
+                      scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    import_results, num_over_budget = run_imports(FLAGS.imports, FLAGS.import_repeats)
+    results += import_results
+
+    report = {'meta': {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'commit': git_commit(),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'machine': platform.platform(),
+                       'seed': FLAGS.seed},
+              'results': results}
+    with open(FLAGS.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('results written to', FLAGS.output)
+
+    if FLAGS.baseline is not None:
+        with open(FLAGS.baseline) as f:
+            baseline = json.load(f)
+        compare(results, baseline, FLAGS.threshold)
+    if num_over_budget:
+        print('{} modules over their import budget'.format(num_over_budget))
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,67 @@
+import os
+import pickle
+
+"""
+This script saves and loads trainer checkpoints. The full game is referenced by
+the trainer, its solvers and its restricted games, but it is the one thing a
+resumed run already has, so it is written as a reference to the meta games the
+checkpoint is loaded with instead of being copied into every checkpoint.
+Objects the trainer shares with others, like the solution cache, are written
+the same way, as references to the ones the loading trainer has.
+"""
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, f, meta_games, shared):
+        super(_Pickler, self).__init__(f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._ids = {id(meta_games): 'meta_games'}
+        for player, meta_game in enumerate(meta_games):
+            self._ids[id(meta_game)] = player
+        for name, obj in shared.items():
+            if obj is not None:
+                self._ids[id(obj)] = name
+
+    def persistent_id(self, obj):
+        return self._ids.get(id(obj))
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, f, meta_games, shared):
+        super(_Unpickler, self).__init__(f)
+        self.meta_games = meta_games
+        self.shared = shared
+
+    def persistent_load(self, pid):
+        if pid == 'meta_games':
+            return self.meta_games
+        if pid in self.shared:
+            return self.shared[pid]
+        return self.meta_games[pid]
+
+
+def save_checkpoint(path, state, meta_games, shared=None):
+    """
+    Pickle state to path atomically: a crash while writing leaves the previous
+    checkpoint in place.
+    Input:
+        state     : anything picklable, may refer to meta_games and its payoff matrices
+        meta_games: the full game, left out of the file
+        shared    : dict of name to object, left out of the file like meta_games
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        _Pickler(f, meta_games, shared or {}).dump(state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def load_checkpoint(path, meta_games, shared=None):
+    """
+    Load a checkpoint written by save_checkpoint, references to the full game
+    pointing to meta_games and references to shared objects to the objects of
+    the same name in shared.
+    """
+    with open(path, 'rb') as f:
+        return _Unpickler(f, meta_games, shared or {}).load()
@@ -0,0 +1,235 @@
+import numpy as np
+
+"""
+This script provides the strategy sets of a PSRO empirical game. Meta-strategies
+accept either an EmpiricalGame or the original list of per-player lists; the
+helpers at the bottom give both the same interface. RestrictedGame keeps the
+payoffs of the restricted game, grown by one row or column per new strategy.
+"""
+
+class RestrictedGame(object):
+    """
+    Payoffs of a two player restricted game in preallocated buffers. Strategies
+    take slots in the order they are added, so adding one copies only its new
+    row or column out of the full game, and view() is a zero-copy k0 x k1 block.
+    The buffers double in size when full.
+    """
+    def __init__(self, meta_games, capacity=64):
+        """
+        Input:
+            meta_games: full game, a list of payoff matrices, one per player
+            capacity  : initial number of slots per player
+        """
+        self.meta_games = meta_games
+        self.capacity = capacity
+        dtype = np.result_type(*[meta_game.dtype for meta_game in meta_games])
+        self._buffers = np.zeros((len(meta_games), capacity, capacity), dtype=dtype)
+        self.slot_strategies = [[], []]
+        self._order = [None, None]
+
+    def copy(self):
+        """
+        A read-only snapshot sharing the buffers. Later adds to this game only
+        write outside the snapshot's block, or into new buffers.
+        """
+        other = RestrictedGame.__new__(RestrictedGame)
+        other.__dict__.update(self.__dict__)
+        other.slot_strategies = [list(ele) for ele in self.slot_strategies]
+        other._order = list(self._order)
+        return other
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        buffers = np.zeros((len(self.meta_games), capacity, capacity), dtype=self._buffers.dtype)
+        k0, k1 = len(self.slot_strategies[0]), len(self.slot_strategies[1])
+        buffers[:, :k0, :k1] = self._buffers[:, :k0, :k1]
+        # a new array, snapshots keep reading the old one
+        self._buffers = buffers
+        self.capacity = capacity
+
+    def add(self, player, strategy):
+        """
+        Give a new strategy of player the next slot and copy its payoffs in, O(k).
+        """
+        slots = self.slot_strategies[player]
+        if len(slots) + 1 > self.capacity:
+            self._grow(len(slots) + 1)
+        k = len(slots)
+        other = self.slot_strategies[1 - player]
+        for p, meta_game in enumerate(self.meta_games):
+            if player == 0:
+                self._buffers[p, k, :len(other)] = meta_game[strategy, other]
+            else:
+                self._buffers[p, :len(other), k] = meta_game[other, strategy]
+        self.slot_strategies[player] = slots + [strategy]
+        self._order[player] = None
+
+    def view(self):
+        """
+        Payoffs of every player on the restricted game, in slot order, without copying.
+        """
+        k0, k1 = len(self.slot_strategies[0]), len(self.slot_strategies[1])
+        return [buffer[:k0, :k1] for buffer in self._buffers]
+
+    def sorted_view(self):
+        """
+        Copy of the restricted game in sorted strategy order, for solvers whose
+        result depends on the order of strategies.
+        """
+        idx = np.ix_(self.order(0), self.order(1))
+        return [subgame[idx] for subgame in self.view()]
+
+    def payoffs(self, probs):
+        """
+        Expected payoff of every player for a profile aligned with the sorted supports.
+        """
+        prob0, prob1 = self.to_slots(probs)
+        return [np.dot(np.dot(prob0, subgame), prob1) for subgame in self.view()]
+
+    def order(self, player):
+        """
+        Slots of player's strategies in sorted strategy order.
+        """
+        if self._order[player] is None:
+            self._order[player] = np.argsort(self.slot_strategies[player], kind='stable')
+        return self._order[player]
+
+    def to_slots(self, probs):
+        """
+        Reorder per-player vectors aligned with the sorted supports into slot order.
+        """
+        slot_probs = []
+        for player, prob in enumerate(probs):
+            slot_prob = np.empty(len(prob))
+            slot_prob[self.order(player)] = prob
+            slot_probs.append(slot_prob)
+        return slot_probs
+
+
+class EmpiricalGame(object):
+    """
+    Strategy sets of all players, updated incrementally as strategies are added.
+    Keeps a presence bitmap for O(1) membership, the insertion log, the number
+    of times each strategy was added (the FP meta-strategy), and caches the
+    sorted support and the np.ix_ index of the restricted game.
+    """
+    def __init__(self, num_strategies, init_strategies=None, num_players=2, meta_games=None):
+        """
+        Input:
+            num_strategies : number of strategies of the full game, per player
+            init_strategies: optional, one initial strategy per player
+            meta_games     : optional full game, to keep a RestrictedGame of the
+                             support up to date as self.restricted
+        """
+        self.num_strategies = num_strategies
+        self.num_players = num_players
+        self.present = np.zeros((num_players, num_strategies), dtype=bool)
+        self.counts = np.zeros((num_players, num_strategies), dtype=int)
+        self.log = [[] for _ in range(num_players)]
+        self._supports = [[] for _ in range(num_players)]
+        self._support_arrays = None
+        self._ix = None
+        self._lists = [None] * num_players
+        self.restricted = None if meta_games is None else RestrictedGame(meta_games)
+        if init_strategies is not None:
+            for player, strategy in enumerate(init_strategies):
+                self.add(player, strategy)
+
+    def add(self, player, strategy):
+        """
+        Add strategy to player's set. Repeats are counted, not duplicated in the support.
+        """
+        strategy = int(strategy)
+        self.log[player].append(strategy)
+        self.counts[player, strategy] += 1
+        self._lists[player] = None
+        if not self.present[player, strategy]:
+            self.present[player, strategy] = True
+            # a new list, callers may hold on to the previous support
+            support = self._supports[player]
+            position = int(np.searchsorted(support, strategy))
+            self._supports[player] = support[:position] + [strategy] + support[position:]
+            self._support_arrays = None
+            self._ix = None
+            if self.restricted is not None:
+                self.restricted.add(player, strategy)
+
+    def copy(self):
+        other = EmpiricalGame.__new__(EmpiricalGame)
+        other.num_strategies = self.num_strategies
+        other.num_players = self.num_players
+        other.present = self.present.copy()
+        other.counts = self.counts.copy()
+        other.log = [list(ele) for ele in self.log]
+        other._supports = list(self._supports)
+        other._support_arrays = self._support_arrays
+        other._ix = self._ix
+        other._lists = list(self._lists)
+        other.restricted = None if self.restricted is None else self.restricted.copy()
+        return other
+
+    def support(self, player):
+        """
+        Sorted distinct strategies of player, as a list. Do not modify it,
+        it is replaced, not updated, when a strategy is added.
+        """
+        return self._supports[player]
+
+    @property
+    def supports(self):
+        return list(self._supports)
+
+    def support_arrays(self):
+        if self._support_arrays is None:
+            self._support_arrays = [np.array(ele, dtype=int) for ele in self._supports]
+        return self._support_arrays
+
+    def ix(self):
+        """
+        np.ix_ index of the restricted game in the full game.
+        """
+        if self._ix is None:
+            self._ix = np.ix_(*self.support_arrays())
+        return self._ix
+
+    def frequencies(self, player):
+        """
+        How often each strategy of the support was added, aligned with support(player).
+        """
+        return self.counts[player, self.support_arrays()[player]]
+
+    def __getitem__(self, player):
+        # sorted strategies with repeats, like the lists the trainer used to keep
+        if self._lists[player] is None:
+            support = self.support_arrays()[player]
+            self._lists[player] = np.repeat(support, self.counts[player, support]).tolist()
+        return self._lists[player]
+
+    def __len__(self):
+        return self.num_players
+
+    def __iter__(self):
+        return (self[player] for player in range(self.num_players))
+
+    def __repr__(self):
+        return 'EmpiricalGame({})'.format(self._supports)
+
+
+def strategy_sets(empirical_games):
+    """
+    Sorted distinct strategies of every player, as lists.
+    """
+    if isinstance(empirical_games, EmpiricalGame):
+        return empirical_games.supports
+    return [sorted(list(set(ele))) for ele in empirical_games]
+
+def restricted_index(empirical_games, supports):
+    """
+    np.ix_ index of the restricted game, cached for an EmpiricalGame.
+    supports are the strategy_sets of empirical_games.
+    """
+    if isinstance(empirical_games, EmpiricalGame):
+        return empirical_games.ix()
+    return np.ix_(*supports)
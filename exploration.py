@@ -66,8 +66,13 @@ class pure_exp(object):
                  fast_period=None,
                  kl_coef=0.1,
                  abs_value=False,
-                 kl_regularization=False):
+                 kl_regularization=False,
+                 rng=None):
+        """
+        rng: a np.random.Generator arms are sampled from, the global np.random if None
+        """
         self.weights = np.ones(num_arms) * 100
+        self.rng = rng
         self.num_arms = num_arms
         self.num_players = num_players
         self.gamma = gamma
@@ -81,7 +86,7 @@ class pure_exp(object):
     def sample(self, num_iters):
         temperature = self.temperature_scheme(num_iters)
         self.probability_distribution = softmax(self.weights, temperature=temperature)
-        self.arm_pulled = np.random.choice(range(len(self.probability_distribution)), p=self.probability_distribution)
+        self.arm_pulled = (np.random if self.rng is None else self.rng).choice(range(len(self.probability_distribution)), p=self.probability_distribution)
         return self.arm_pulled
 
     def update_weights(self, reward, NE_list=None):
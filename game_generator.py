@@ -8,31 +8,66 @@ class Game_generator(object):
                  payoff_lb=-10):
         self.num_strategies = num_strategies
         self.num_players = num_players
-        assert num_players == 2
+        assert num_players >= 2
         self.payoff_ub = payoff_ub
         self.payoff_lb = payoff_lb
+        # one axis per player, each with num_strategies strategies
+        self.shape = (num_strategies,) * num_players
 
-    def zero_sum_game(self):
-        meta_game = np.random.randint(low=self.payoff_lb,
-                                      high=self.payoff_ub,
-                                      size=(self.num_strategies, self.num_strategies))
-        return [meta_game, -meta_game]
+    def _random_payoffs(self, meta_game, chunk_rows):
+        """
+        Fill a (possibly memory-mapped) payoff tensor chunk by chunk along
+        the first player's axis. Draws come in the same order as a single
+        randint call.
+        """
+        for start in range(0, self.num_strategies, chunk_rows):
+            stop = min(start + chunk_rows, self.num_strategies)
+            meta_game[start:stop] = np.random.randint(low=self.payoff_lb,
+                                                      high=self.payoff_ub,
+                                                      size=(stop - start,) + self.shape[1:])
 
-    def general_sum_game(self):
-        meta_game1 = np.random.randint(low=self.payoff_lb,
+    def zero_sum_game(self, store=None, name=None, chunk_rows=1024):
+        """
+        Input:
+            store: a game_store.GameStore. If given, the game is generated
+                   straight into memory maps saved under name and returned opened
+                   lazily, so it never has to fit in memory.
+        With more than two players, the last player's payoff is minus the sum
+        of the others'.
+        """
+        if store is None:
+            meta_games = [np.random.randint(low=self.payoff_lb,
+                                            high=self.payoff_ub,
+                                            size=self.shape) for _ in range(self.num_players - 1)]
+            return meta_games + [-sum(meta_games)]
+        meta_games = store.create(name, self.shape, dtype=int, num_players=self.num_players)
+        for meta_game in meta_games[:-1]:
+            self._random_payoffs(meta_game, chunk_rows)
+        for start in range(0, self.num_strategies, chunk_rows):
+            chunk = slice(start, start + chunk_rows)
+            meta_games[-1][chunk] = -sum(meta_game[chunk] for meta_game in meta_games[:-1])
+        return store.commit(name, meta_games)
+
+    def general_sum_game(self, store=None, name=None, chunk_rows=1024):
+        if store is None:
+            return [np.random.randint(low=self.payoff_lb,
                                       high=self.payoff_ub,
-                                      size=(self.num_strategies, self.num_strategies))
-        meta_game2 = np.random.randint(low=self.payoff_lb,
-                                       high=self.payoff_ub,
-                                       size=(self.num_strategies, self.num_strategies))
-        return [meta_game1, meta_game2]
+                                      size=self.shape) for _ in range(self.num_players)]
+        meta_games = store.create(name, self.shape, dtype=int, num_players=self.num_players)
+        for meta_game in meta_games:
+            self._random_payoffs(meta_game, chunk_rows)
+        return store.commit(name, meta_games)
 
-    def symmetric_zero_sum_game(self):
+    def symmetric_zero_sum_game(self, store=None, name=None):
+        assert self.num_players == 2, "symmetric zero-sum games are two player"
         meta_game = np.random.randint(low=self.payoff_lb/2,
                                       high=np.ceil(self.payoff_ub/2),
                                       size=(self.num_strategies, self.num_strategies))
         meta_game += meta_game.T
-        return [meta_game, -meta_game]
+        if store is None:
+            return [meta_game, -meta_game]
+        # the transpose needs the whole matrix, so this one is built in memory
+        return store.put(name, [meta_game, -meta_game])
 
     def transitive_game(self):
         raise NotImplementedError
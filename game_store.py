@@ -0,0 +1,145 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+
+"""
+This script keeps meta games on disk as one .npy file per player, next to a
+small json catalog. Games are opened as read-only memory maps, so opening is
+instant regardless of size and payoff rows are paged in only when touched.
+"""
+
+CATALOG = 'catalog.json'
+
+def content_hash(meta_games, chunk_rows=1024):
+    """
+    sha256 over shape, dtype and payoffs of every player, read in row chunks
+    so that memory-mapped games are never loaded at once.
+    """
+    sha = hashlib.sha256()
+    for meta_game in meta_games:
+        sha.update(str((meta_game.shape, meta_game.dtype.str)).encode())
+        for start in range(0, meta_game.shape[0], chunk_rows):
+            sha.update(np.ascontiguousarray(meta_game[start:start+chunk_rows]).tobytes())
+    return sha.hexdigest()
+
+def is_zero_sum(meta_games, chunk_rows=1024, tol=1e-10):
+    """
+    Whether payoffs of all players sum to zero, up to tol as in
+    minimum_regret_profile_calculator, checked in chunks along the first axis.
+    """
+    for start in range(0, meta_games[0].shape[0], chunk_rows):
+        chunk = slice(start, start + chunk_rows)
+        if np.any(np.absolute(sum(meta_game[chunk] for meta_game in meta_games)) > tol):
+            return False
+    return True
+
+def payoff_minimums(meta_games, chunk_rows=1024):
+    """
+    Smallest payoff of every player, read in row chunks.
+    """
+    minimums = []
+    for meta_game in meta_games:
+        minimum = min(np.min(meta_game[start:start+chunk_rows]) for start in range(0, meta_game.shape[0], chunk_rows))
+        minimums.append(minimum.item())
+    return minimums
+
+
+class GameStore(object):
+    """
+    A directory of memory-mapped meta games indexed by name.
+    """
+    def __init__(self, root='game_store'):
+        self.root = root
+        if not os.path.exists(root):
+            os.makedirs(root)
+        path = os.path.join(root, CATALOG)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.catalog = json.load(f)
+        else:
+            self.catalog = {}
+
+    def _write_catalog(self):
+        path = os.path.join(self.root, CATALOG)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.catalog, f, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def _paths(self, name, num_players):
+        return [os.path.join(self.root, '{}_player{}.npy'.format(name, i)) for i in range(num_players)]
+
+    def __contains__(self, name):
+        return name in self.catalog
+
+    def names(self):
+        return sorted(self.catalog)
+
+    def info(self, name):
+        """
+        Catalog entry of a game: shape, dtype, zero_sum flag, smallest payoff
+        of every player (payoff_min) and content hash. Entries written before
+        payoff_min was recorded do not have it.
+        """
+        return self.catalog[name]
+
+    def create(self, name, shape, dtype=np.int64, num_players=2):
+        """
+        Allocate writable memory maps for a new game, to be filled in place
+        (e.g. row chunk by row chunk) and then registered with commit.
+        """
+        if name in self.catalog:
+            raise ValueError("game {} already in the store".format(name))
+        return [np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+                for path in self._paths(name, num_players)]
+
+    def commit(self, name, meta_games):
+        """
+        Flush a game made by create and record it in the catalog.
+        """
+        for meta_game in meta_games:
+            meta_game.flush()
+        self.catalog[name] = {'shape': list(meta_games[0].shape),
+                              'dtype': meta_games[0].dtype.str,
+                              'num_players': len(meta_games),
+                              'zero_sum': is_zero_sum(meta_games),
+                              'payoff_min': payoff_minimums(meta_games),
+                              'hash': content_hash(meta_games)}
+        self._write_catalog()
+        return self.open(name)
+
+    def put(self, name, meta_games):
+        """
+        Copy in-memory payoff matrices into the store.
+        Input:
+            name      : key of the game in the catalog
+            meta_games: a list of payoff matrices, one per player
+        Output:
+            the stored game, opened as read-only memory maps
+        """
+        stored = self.create(name, meta_games[0].shape, meta_games[0].dtype, len(meta_games))
+        for stored_game, meta_game in zip(stored, meta_games):
+            stored_game[...] = meta_game
+        return self.commit(name, stored)
+
+    def put_pickle(self, name, path):
+        """
+        Import a pickled meta game, e.g. one of efg_game/.
+        """
+        with open(path, 'rb') as f:
+            meta_games = pickle.load(f)
+        return self.put(name, [np.asarray(meta_game) for meta_game in meta_games])
+
+    def open(self, name):
+        """
+        Open a stored game lazily as read-only memory maps.
+        """
+        entry = self.catalog[name]
+        return [np.load(path, mmap_mode='r') for path in self._paths(name, entry['num_players'])]
+
+    def remove(self, name):
+        entry = self.catalog.pop(name)
+        for path in self._paths(name, entry['num_players']):
+            os.remove(path)
+        self._write_catalog()
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import collections
+import numpy as np
+
+"""
+This script collects per-iteration timing and counter records from PSRO_trainer
+and the solvers it calls. Solvers report through the module functions phase,
+count and counted, which do nothing unless a Recorder is active, so leaving
+instrumentation off costs one global lookup per call site.
+"""
+
+class MemorySink(object):
+    """
+    Keep records in a list, e.g. for notebooks and tests.
+    """
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class JsonlSink(object):
+    """
+    Append records to a file, one json object per line, flushed on every record.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __getstate__(self):
+        # each process opens its own handle
+        state = dict(self.__dict__)
+        state['_file'] = None
+        return state
+
+    def emit(self, record):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(record, default=_to_json) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _to_json(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    raise TypeError(type(value))
+
+
+class Recorder(object):
+    """
+    Accumulate phase wall times and counters, and emit them as one record per
+    PSRO iteration to a sink. Phases are inclusive: a phase timed inside
+    another one also counts towards the outer phase.
+    """
+    def __init__(self, sink):
+        self.sink = sink
+        self._phases = collections.defaultdict(float)
+        self._counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._phases[name] += elapsed
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def emit(self, **fields):
+        """
+        Emit the phases and counters gathered since the last emit, with fields.
+        """
+        with self._lock:
+            record = dict(fields)
+            record['phases'] = dict(self._phases)
+            record['counters'] = dict(self._counters)
+            self._phases.clear()
+            self._counters.clear()
+        self.sink.emit(record)
+
+
+_active = None
+_null_phase = contextlib.nullcontext()
+
+@contextlib.contextmanager
+def recording(recorder):
+    """
+    Make recorder the target of phase, count and counted within the block.
+    """
+    global _active
+    previous = _active
+    _active = recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+def phase(name):
+    """
+    Time a block as phase name of the active recorder, if there is one.
+    """
+    recorder = _active
+    if recorder is None:
+        return _null_phase
+    return recorder.phase(name)
+
+def count(name, n=1):
+    recorder = _active
+    if recorder is not None:
+        recorder.count(name, n)
+
+def counted(func, name):
+    """
+    Count the calls of func under name. func may take a single point or a
+    stack of points, which counts as one call per point. Returns func itself
+    when no recorder is active.
+    """
+    recorder = _active
+    if recorder is None:
+        return func
+    def wrapper(points):
+        recorder.count(name, 1 if np.ndim(points) == 1 else len(points))
+        return func(points)
+    return wrapper
@@ -0,0 +1,103 @@
+import numpy as np
+
+"""
+This script evaluates mixed-strategy profiles of a full game in batches. A
+profile gives each player one probability vector. A batch of P profiles gives
+each player a (P, N_i) stack of such vectors. The kernels contract each payoff
+tensor with a whole stack at once, so for two players P profiles cost one
+matrix-matrix product per player instead of P matrix-vector products. The
+single-profile functions in utils are wrappers around them; called with single
+vectors, partial_payoffs, expected_payoffs and best_responses run the same
+operations those functions always ran.
+"""
+
+def partial_payoffs(payoff_tensor, probs, player):
+    """
+    Expected payoff of each strategy of player against the other players'
+    mixed strategies, contracting one axis at a time as in
+    _partial_multi_dot in nash_solver/replicator_dynamics_solver.py.
+    Input:
+        payoff_tensor: payoff of one player, one axis per player
+        probs        : mixed strategy of every player matching payoff_tensor's
+                       shape, either all vectors or all (P, N_i) stacks
+        player       : the player whose axis is kept
+    Output:
+        a vector of length payoff_tensor.shape[player], or a (P, N_player) stack
+    """
+    batched = np.ndim(probs[0]) == 2
+    new_axis_order = [player] + [i for i in range(len(probs)) if i != player]
+    accumulator = np.transpose(payoff_tensor, new_axis_order)
+    contracted = False
+    for i in range(len(probs) - 1, -1, -1):
+        if i == player:
+            continue
+        if not batched:
+            accumulator = np.dot(accumulator, probs[i])
+        elif not contracted:
+            # the profile axis goes last: (..., N_i) x (N_i, P)
+            accumulator = np.dot(accumulator, probs[i].T)
+        else:
+            accumulator = np.einsum('...jp,pj->...p', accumulator, probs[i])
+        contracted = True
+    return accumulator.T if batched else accumulator
+
+def _row_dot(payoff_vec, prob):
+    """
+    Dot product of a vector, or of every row of a (P, N) stack, with prob.
+    """
+    if np.ndim(payoff_vec) == 1:
+        return np.dot(payoff_vec, prob)
+    return np.einsum('pj,pj->p', payoff_vec, prob)
+
+def expected_payoffs(meta_games, probs):
+    """
+    Expected payoff of every player under the profiles.
+    Input:
+        meta_games: payoff tensors of all players, one axis per player
+        probs     : mixed strategy of every player, vectors or (P, N_i) stacks
+    Output:
+        a vector with one payoff per player, or a (P, num_players) array
+    """
+    payoffs = [_row_dot(partial_payoffs(meta_game, probs, 0), probs[0]) for meta_game in meta_games]
+    return np.stack(payoffs, axis=-1)
+
+def best_responses(meta_games, probs):
+    """
+    Best response of every player to the others' mixed strategies.
+    Input:
+        meta_games: payoff tensors of all players, one axis per player
+        probs     : full length mixed strategy of every player, vectors or (P, N_i) stacks
+    Output:
+        dev_strs  : best response strategy of every player, (num_players,) or (P, num_players)
+        dev_payoff: payoff of each best response, same shape
+    """
+    dev_strs = []
+    dev_payoff = []
+    for player, meta_game in enumerate(meta_games):
+        payoff_vec = partial_payoffs(meta_game, probs, player)
+        idx = np.argmax(payoff_vec, axis=-1)
+        dev_strs.append(idx)
+        dev_payoff.append(np.take_along_axis(payoff_vec, idx[..., None], axis=-1)[..., 0])
+    return np.stack(dev_strs, axis=-1), np.stack(dev_payoff, axis=-1)
+
+def regrets(meta_games, probs):
+    """
+    Regret of every player: payoff of the best response minus the payoff of
+    the profile. Both come from the same partial payoffs, one product with
+    each player's payoff tensor.
+    Output:
+        a vector with one regret per player, or a (P, num_players) array
+    """
+    regret = []
+    for player, meta_game in enumerate(meta_games):
+        payoff_vec = partial_payoffs(meta_game, probs, player)
+        regret.append(np.max(payoff_vec, axis=-1) - _row_dot(payoff_vec, probs[player]))
+    return np.stack(regret, axis=-1)
+
+def nashconv(meta_games, probs):
+    """
+    NashConv, the summed regret of all players.
+    Output:
+        a number, or a vector of length P
+    """
+    return np.sum(regrets(meta_games, probs), axis=-1)
@@ -1,21 +1,62 @@
 import numpy as np
-import collections
-from nash_solver.general_nash_solver import gambit_solve
+from nash_solver.general_nash_solver import nash_dispatcher
 from minimum_regret_profile import minimum_regret_profile_calculator
+from empirical_game import EmpiricalGame, strategy_sets, restricted_index
 from utils import *
+import instrumentation
 
-def double_oracle(meta_games, empirical_games, checkpoint_dir):
+def double_oracle(meta_games, empirical_games, checkpoint_dir, nash_solver=None, cache=None):
+    """
+    nash_solver: a stateful solver called as nash_solver(idx0, idx1), e.g. the
+    IncrementalNashSolver owned by the trainer, which tries the structural
+    solvers of NashDispatcher before warm-starting. nash_dispatcher if not
+    provided, which picks a solver by the size and structure of the restricted game.
+    cache      : a SolutionCache of restricted game NE, consulted before solving.
+                 An incremental nash_solver's equilibrium depends on its warm-start
+                 state, so its entries are keyed by the restricted game and the
+                 solver's fingerprint, and restore the solver's state on a hit.
+    """
     num_players = len(meta_games)
     num_strategies, _ = np.shape(meta_games[0])
     subgames = []
 
-    idx0 = sorted(list(set(empirical_games[0])))
-    idx1 = sorted(list(set(empirical_games[1])))
-    idx = np.ix_(idx0, idx1)
-    for meta_game in meta_games:
-        subgames.append(meta_game[idx])
-    nash = gambit_solve(subgames, mode="one", checkpoint_dir=checkpoint_dir[:-1])
-    nash_payoffs = mixed_strategy_payoff(subgames, nash)
+    idx0, idx1 = strategy_sets(empirical_games)
+    # payoffs of an EmpiricalGame's restricted game are kept up to date in a buffer
+    restricted = getattr(empirical_games, 'restricted', None)
+    if restricted is None:
+        idx = restricted_index(empirical_games, [idx0, idx1])
+        for meta_game in meta_games:
+            subgames.append(meta_game[idx])
+    incremental = nash_solver is not None and hasattr(nash_solver, 'fingerprint')
+    nash = None
+    if cache is not None and incremental:
+        fingerprint = nash_solver.fingerprint()
+        cached = cache.get('ne_incremental', meta_games, [idx0, idx1], context=(fingerprint,))
+        if cached is not None:
+            nash, state = cached
+            nash_solver.restore(state)
+    elif cache is not None:
+        nash = cache.get('ne', meta_games, [idx0, idx1])
+    if nash is None:
+        instrumentation.count('nash_solves')
+        with instrumentation.phase('nash_solve'):
+            if nash_solver is None:
+                if restricted is not None:
+                    subgames = restricted.sorted_view()
+                nash = nash_dispatcher(subgames, mode="one", checkpoint_dir=checkpoint_dir[:-1])
+                instrumentation.count('nash_backend_' + nash_dispatcher.last_backend)
+            else:
+                nash = nash_solver(idx0, idx1)
+                if getattr(nash_solver, 'last_backend', None) is not None:
+                    instrumentation.count('nash_backend_' + nash_solver.last_backend)
+        if cache is not None and incremental:
+            cache.put('ne_incremental', meta_games, [idx0, idx1], (nash, nash_solver.state()), context=(fingerprint,))
+        elif cache is not None:
+            cache.put('ne', meta_games, [idx0, idx1], nash)
+    if restricted is None:
+        nash_payoffs = mixed_strategy_payoff(subgames, nash)
+    else:
+        nash_payoffs = restricted.payoffs(nash)
 
     meta_game_nash = []
     for i, idx in enumerate([idx0, idx1]):
@@ -23,7 +64,8 @@ def double_oracle(meta_games, empirical_games, checkpoint_dir):
         np.put(ne, idx, nash[i])
         meta_game_nash.append(ne)
 
-    dev_strs, dev_payoff = deviation_strategy(meta_games, meta_game_nash)
+    with instrumentation.phase('best_response'):
+        dev_strs, dev_payoff = deviation_strategy(meta_games, meta_game_nash)
     nashconv = 0
     for player in range(num_players):
         nashconv += np.maximum(dev_payoff[player] - nash_payoffs[player], 0)
@@ -32,57 +74,100 @@ def double_oracle(meta_games, empirical_games, checkpoint_dir):
 
 
 
-def fictitious_play(meta_games, empirical_games, checkpoint_dir=None):
-    num_strategies, _ = np.shape(meta_games[0])
-    subgames = []
-    counter0 = collections.Counter(empirical_games[0])
-    counter1 = collections.Counter(empirical_games[1])
-
-    idx0 = sorted(list(set(empirical_games[0])))
-    idx1 = sorted(list(set(empirical_games[1])))
-    idx = np.ix_(idx0, idx1)
-    for meta_game in meta_games:
-        subgames.append(meta_game[idx])
-
-    nash0 = np.ones(len(idx0))
-    for i, item in enumerate(idx0):
-        nash0[i] = counter0[item]
-    nash0 /= np.sum(nash0)
-
-    nash1 = np.ones(len(idx1))
-    for i, item in enumerate(idx1):
-        nash1[i] = counter1[item]
-    nash1 /= np.sum(nash1)
-    nash = [nash0, nash1]
-    
-    nash_payoffs = mixed_strategy_payoff(subgames, nash)
-
-    meta_game_nash = []
-    for i, idx in enumerate([idx0, idx1]):
-        ne = np.zeros(num_strategies)
-        np.put(ne, idx, nash[i])
-        meta_game_nash.append(ne)
-
-    dev_strs, dev_payoff = deviation_strategy(meta_games, meta_game_nash)
-
-    nashconv = 0
-    for player in range(len(meta_games)):
-        nashconv += np.maximum(dev_payoff[player] - nash_payoffs[player], 0)
-
-    return dev_strs, nashconv
+def fictitious_play(meta_games, empirical_games, checkpoint_dir=None, fp_solver=None):
+    """
+    fp_solver: an IncrementalFictitiousPlay kept across the iterations of a
+    round, e.g. the one owned by the trainer. Without it a new one replays the
+    history of empirical_games, so that both compute the same sums in the same
+    order and break ties between best responses alike, to the lowest index.
+    """
+    if fp_solver is None:
+        fp_solver = IncrementalFictitiousPlay(meta_games)
+    return fp_solver(empirical_games)
 
-def mrcp_solver(meta_games, empirical_games, checkpoint_dir=None, recursive=False):
+class IncrementalFictitiousPlay(object):
+    """
+    Fictitious play of a two-player game that keeps, for every strategy of
+    each player, its cumulative payoff against the other player's history,
+    sum_t A[:, s_t] and sum_t B[s_t, :]. A strategy added to the empirical
+    game costs one row or column add, and the best responses and NashConv of
+    the FP profile are O(N) per call instead of products with the full game.
+    """
+    def __init__(self, meta_games):
+        assert len(meta_games) == 2, 'incremental fictitious play only works for two-player games'
+        self.meta_games = meta_games
+        self.clear()
+
+    def clear(self):
+        """
+        Forget the history, call at the start of every PSRO round.
+        """
+        self._empirical_games = None
+        self._seen = [0, 0]
+        self.counts = [np.zeros(self.meta_games[0].shape[player], dtype=int) for player in range(2)]
+        self.cumulative_payoffs = [np.zeros(self.meta_games[0].shape[player]) for player in range(2)]
+
+    def add(self, player, strategy):
+        """
+        Count one more play of strategy by player, O(N).
+        """
+        self.counts[player][strategy] += 1
+        if player == 0:
+            self.cumulative_payoffs[1] += self.meta_games[1][strategy, :]
+        else:
+            self.cumulative_payoffs[0] += self.meta_games[0][:, strategy]
+
+    def _sync(self, empirical_games):
+        """
+        Add the strategies of empirical_games not seen yet. An EmpiricalGame is
+        followed through its insertion log, lists of strategies are taken as
+        one; another game, or one that shrank, restarts the history.
+        """
+        logs = empirical_games.log if isinstance(empirical_games, EmpiricalGame) else empirical_games
+        if empirical_games is not self._empirical_games or any(len(log) < seen for log, seen in zip(logs, self._seen)):
+            self.clear()
+            self._empirical_games = empirical_games
+        for player, log in enumerate(logs):
+            for strategy in log[self._seen[player]:]:
+                self.add(player, strategy)
+            self._seen[player] = len(log)
+
+    def __call__(self, empirical_games):
+        """
+        Output:
+            best responses to the FP profile of empirical_games and its NashConv,
+            as fictitious_play
+        """
+        self._sync(empirical_games)
+        totals = [self._seen[0], self._seen[1]]
+        dev_strs = []
+        nashconv = 0
+        with instrumentation.phase('best_response'):
+            for player in range(2):
+                # payoffs of player's strategies against the other's FP strategy
+                payoff_vec = self.cumulative_payoffs[player] / totals[1 - player]
+                dev_str = np.argmax(payoff_vec)
+                nash_payoff = np.dot(self.counts[player], payoff_vec) / totals[player]
+                dev_strs.append(dev_str)
+                nashconv += np.maximum(payoff_vec[dev_str] - nash_payoff, 0)
+        return dev_strs, nashconv
+
+def mrcp_solver(meta_games, empirical_games, checkpoint_dir=None, recursive=False, branch_and_bound=False, cache=None, zero_sum=None):
     """
     A wrapper for minimum_regret_profile_calculator, automatically test iterations and clearning remnants mrcp values
+    branch_and_bound: prune subgames in the recursive mode, see minimum_regret_profile_calculator
+    cache           : a SolutionCache handed to the calculator
+    zero_sum        : whether meta_games is zero-sum, if known, see minimum_regret_profile_calculator
     """
     if not hasattr(mrcp_solver, "mrcp_calculator"):
-        mrcp_solver.mrcp_calculator  = minimum_regret_profile_calculator(full_game=meta_games, recursive=recursive)
+        mrcp_solver.mrcp_calculator  = minimum_regret_profile_calculator(full_game=meta_games, recursive=recursive, branch_and_bound=branch_and_bound, cache=cache, zero_sum=zero_sum)
     else:
-        # test full game the same
-        full_game_different = meta_games[0].shape != mrcp_solver.mrcp_calculator.full_game[0].shape or np.sum(np.absolute(meta_games[0]-mrcp_solver.mrcp_calculator.full_game[0]),axis=None) != 0
+        # test full game the same, the same meta games object needs no comparison
+        full_game = mrcp_solver.mrcp_calculator.full_game
+        full_game_different = meta_games is not full_game and (meta_games[0].shape != full_game[0].shape or np.sum(np.absolute(meta_games[0]-full_game[0]),axis=None) != 0)
         if full_game_different: # change mrcp_calculator
             print('changing mrcp calculator!!!')
-            mrcp_solver.mrcp_calculator = minimum_regret_profile_calculator(full_game=meta_games, recursive=recursive)
+            mrcp_solver.mrcp_calculator = minimum_regret_profile_calculator(full_game=meta_games, recursive=recursive, branch_and_bound=branch_and_bound, cache=cache, zero_sum=zero_sum)
         elif mrcp_solver.mrcp_calculator.mrcp_empirical_game is not None and len(empirical_games[0])<=len(mrcp_solver.mrcp_calculator.mrcp_empirical_game[0]):
             # another round of random start from full game, might exsit potential bugs
             # as I changed _last_empirical_game to mrcp_empirical_game
@@ -90,8 +175,10 @@ def mrcp_solver(meta_games, empirical_games, checkpoint_dir=None, recursive=Fals
             mrcp_solver.mrcp_calculator.clear()
         else:
             pass
+    mrcp_solver.mrcp_calculator.cache = cache
 
-    mrcp_solver.mrcp_calculator(empirical_games)
+    with instrumentation.phase('mrcp_solve'):
+        mrcp_solver.mrcp_calculator(empirical_games)
 
     num_strategies = meta_games[0].shape[0]
     idx0 = sorted(list(set(mrcp_solver.mrcp_calculator.mrcp_empirical_game[0])))
@@ -105,19 +192,11 @@ def mrcp_solver(meta_games, empirical_games, checkpoint_dir=None, recursive=Fals
     
     # find deviation that is not in the empirical game
     dev_strs = []
-    prob1 = meta_game_nash[0]
-    prob1 = np.reshape(prob1, newshape=(len(prob1), 1))
-    prob2 = meta_game_nash[1]
-
-    payoff_vec = np.sum(meta_games[0] * prob2, axis=1)
-    payoff_vec = np.reshape(payoff_vec, -1)
-    # mask elements inside empirical game
-    payoff_vec[list(set(empirical_games[0]))] = -1e5
-    dev_strs.append(np.argmax(payoff_vec))
-
-    payoff_vec = np.sum(prob1 * meta_games[1], axis=0)
-    payoff_vec = np.reshape(payoff_vec, -1)
-    payoff_vec[list(set(empirical_games[1]))] = -1e5
-    dev_strs.append(np.argmax(payoff_vec))
+    with instrumentation.phase('best_response'):
+        for player, support in enumerate(strategy_sets(empirical_games)):
+            payoff_vec = partial_payoff(meta_games[player], meta_game_nash, player)
+            # mask elements inside empirical game
+            payoff_vec[support] = -1e5
+            dev_strs.append(np.argmax(payoff_vec))
 
     return dev_strs, mrcp_solver.mrcp_calculator.mrcp_value
@@ -2,7 +2,67 @@ import numpy as np
 from functools import partial
 from itertools import chain, combinations,product
 
-from amoeba import amoeba_mrcp
+from amoeba import amoeba_mrcp, amoeba_mrcp_batch
+from utils import regret_objective
+from empirical_game import strategy_sets
+import instrumentation
+
+def zero_sum_mrcp(empirical_game, full_game):
+    '''
+    Exact MRCP of a two player zero-sum game. The profile payoffs of the two
+    players cancel, so the regret of (p, q) is max_i (A q)_i + max_j (p B)_j
+    which separates into one linear program per player:
+        min t s.t. A[:, S1] q <= t, q in simplex
+        min u s.t. B[S0, :]^T p <= u, p in simplex
+    Input:
+        empirical_game: each player's strategy set, sorted and without duplicates
+        full_game     : the full zero-sum meta game
+    Output:
+        mrcp profile on the empirical game, its regret, number of LP iterations,
+        or None if the LP solver fails
+    '''
+    from scipy.optimize import linprog
+    profile = []
+    num_lp_iterations = 0
+    for player, dev_payoff in enumerate([full_game[0][:, empirical_game[1]],
+                                         full_game[1][empirical_game[0], :].T]):
+        num_dev, k = dev_payoff.shape
+        res = linprog(c=np.append(np.zeros(k), 1),
+                      A_ub=np.hstack([dev_payoff, -np.ones((num_dev, 1))]),
+                      b_ub=np.zeros(num_dev),
+                      A_eq=np.append(np.ones(k), 0)[None, :],
+                      b_eq=[1],
+                      bounds=[(0, None)]*k + [(None, None)],
+                      method='highs')
+        instrumentation.count('lp_solves')
+        if res.status != 0:
+            return None
+        num_lp_iterations += res.nit
+        prob = np.maximum(res.x[:k], 0)
+        profile.append(prob / np.sum(prob))
+    # profile[0] is the column player's strategy, from the first program
+    profile = profile[::-1]
+    value = regret_objective(empirical_game, full_game)(np.concatenate(profile))
+    return profile, value, num_lp_iterations
+
+def regret_lower_bound(support, full_game):
+    '''
+    Cheap lower bound on the regret of every profile supported within support,
+    from per-strategy best-response bounds on the full game. For any q on S1
+    and every row i, max_i' (A q)_i' - p A q >= min_{j in S1} (A_ij - max_{i' in S0} A_i'j),
+    and symmetrically for the column player. Costs O(N*k).
+    Input:
+        support  : each player's strategies, a subgame of the empirical game
+        full_game: the full two player meta game
+    '''
+    support0, support1 = [list(ele) for ele in support]
+    dev_payoff0 = full_game[0][:, support1]                  # N x k1
+    best_in_support0 = np.max(dev_payoff0[support0], axis=0)  # k1
+    bound0 = np.max(np.min(dev_payoff0 - best_in_support0, axis=1))
+    dev_payoff1 = full_game[1][support0, :]                  # k0 x N
+    best_in_support1 = np.max(dev_payoff1[:, support1], axis=1)  # k0
+    bound1 = np.max(np.min(dev_payoff1 - best_in_support1[:, None], axis=0))
+    return max(bound0, 0) + max(bound1, 0)
 
 class minimum_regret_profile_calculator(object):
     """
@@ -10,15 +70,37 @@ class minimum_regret_profile_calculator(object):
     Assume the mimimum_regret_profile_calculator is called every iteration of PSRO
     applicable to multiple player case.
     """
-    def __init__(self, full_game, recursive=False):
+    def __init__(self, full_game, recursive=False, batched=True, exact_zero_sum=True, branch_and_bound=False, cache=None, zero_sum=None):
         """
         Input:
             full_game     : full matrix game to calculate regret
             recursive     : explore all subgames in the restricted index
+            batched       : run the random restarts of find_mrcp as one amoeba_mrcp_batch
+            exact_zero_sum: solve MRCP of zero-sum games exactly with zero_sum_mrcp
+            branch_and_bound: in recursive mode, skip subgames whose regret_lower_bound
+                            cannot beat mrcp_value, exploring low bounds first
+            cache         : a SolutionCache consulted before solving an empirical
+                            game in the non-recursive modes. The random restarts
+                            of an empirical game are drawn from restart_rng, not
+                            from np.random, so a hit leaves the same random state
+                            and gives the same result as a miss.
+            zero_sum      : whether full_game is zero-sum, e.g. the flag of its
+                            GameStore catalog entry. Checked on full_game when
+                            not given.
         """
         self.full_game = full_game
         self.no_derivative_opt_method = partial(amoeba_mrcp, full_game=full_game)
+        self.batched_opt_method = partial(amoeba_mrcp_batch, full_game=full_game)
         self.recursive = recursive
+        self.batched = batched
+        if zero_sum is None:
+            zero_sum = not np.any(np.absolute(full_game[0] + full_game[1]) > 1e-10)
+        self.zero_sum = len(full_game) == 2 and zero_sum
+        self.exact_zero_sum = exact_zero_sum
+        self.branch_and_bound = branch_and_bound
+        self.cache = cache
+        self.num_pruned = 0  # subgames skipped by the last recursive_find_mrcp
+        self.num_solved = 0  # subgames solved by amoeba in the last recursive_find_mrcp
         # mrcp_profile and mrcp_value records the last iteration's meta game's
         # minimum regret profile and value, which corresponds to last_empirical_game.
         # Anything besides it in the past history does not need to be
@@ -30,6 +112,17 @@ class minimum_regret_profile_calculator(object):
         self.mrcp_value = 1e5 #beware of the game who's payoff is even larger
         self.mrcp_empirical_game = None # documents the empircal game for the last mrcp
 
+    def restart_rng(self, empirical_game):
+        """
+        Generator of the random restarts of find_mrcp, seeded by the sorted
+        strategy sets: the cache key without the game, which is the same for
+        the whole run. MRCP is then deterministic given the empirical game.
+        """
+        entropy = []
+        for strategies in empirical_game:
+            entropy += [len(strategies)] + [int(s) for s in strategies]
+        return np.random.default_rng(entropy)
+
     def clear(self):
         self._last_empirical_game = None
         self._mrcp_iteration = 0
@@ -47,11 +140,39 @@ class minimum_regret_profile_calculator(object):
         #print('profile',profile)
         #return profile_recursive, value_recursive
 
-        if self.recursive:
+        if self.exact_zero_sum and self.zero_sum:
+            return self.lp_find_mrcp(empirical_game)
+        elif self.recursive:
             return self.recursive_find_mrcp(empirical_game)
         else:
             return self.find_mrcp(empirical_game)
     
+    def lp_find_mrcp(self, empirical_game):
+        '''
+        Exact and deterministic MRCP for zero-sum full games. The LP optimizes
+        over every support inside the empirical game, so it serves both the
+        recursive and the non-recursive mode. Falls back to amoeba if the LP fails.
+        Input:
+            empirical_game: the strategy set players have at this iteration of psro
+        '''
+        empirical_game = strategy_sets(empirical_game)
+        result = None if self.cache is None else self.cache.get('mrcp_lp', self.full_game, empirical_game)
+        if result is None:
+            result = zero_sum_mrcp(empirical_game, self.full_game)
+            if result is not None and self.cache is not None:
+                self.cache.put('mrcp_lp', self.full_game, empirical_game, result)
+        if result is None:
+            print('LP failed, falling back to amoeba')
+            return self.recursive_find_mrcp(empirical_game) if self.recursive else self.find_mrcp(empirical_game)
+        mrcp_mixed_strategy, mrcp_value, iteration = result
+        if self.mrcp_value > mrcp_value:
+            self.mrcp_value = mrcp_value
+            self._mrcp_iteration = iteration
+            self.mrcp_empirical_game = empirical_game
+            self.mrcp_profile = mrcp_mixed_strategy
+        self._last_empirical_game = empirical_game
+        return self.mrcp_profile, self.mrcp_value
+
     def find_mrcp(self, empirical_game, repeat=100):
         '''
         Implement ways in 'analyzing complex strategc interactions in multiagent systems' by Walsh el.
@@ -61,16 +182,45 @@ class minimum_regret_profile_calculator(object):
             repeat        : number of different initial points(different trials) to start with
         '''
         # first remove duplicate from empirical game
-        empirical_game = [sorted(list(set(ele))) for ele in empirical_game]
-        
+        empirical_game = strategy_sets(empirical_game)
+
+        cached = None if self.cache is None else self.cache.get('mrcp_amoeba', self.full_game, empirical_game)
+        if cached is not None:
+            mrcp_mixed_strategy, mrcp_value, iteration = cached
+            if self.mrcp_value > mrcp_value:
+                self.mrcp_value = mrcp_value
+                self._mrcp_iteration = iteration
+                self.mrcp_empirical_game = empirical_game
+                self.mrcp_profile = mrcp_mixed_strategy
+            return self.mrcp_profile, self.mrcp_value
+
+        if self.batched:
+            # all restarts at once, same best profile as the loop below
+            mrcp_mixed_strategy, mrcp_value, iteration = self.batched_opt_method(empirical_game, num_restarts=repeat, var='rand', rng=self.restart_rng(empirical_game))
+            if self.cache is not None:
+                self.cache.put('mrcp_amoeba', self.full_game, empirical_game, (mrcp_mixed_strategy, mrcp_value, iteration))
+            if self.mrcp_value > mrcp_value:
+                self.mrcp_value = mrcp_value
+                self._mrcp_iteration = iteration
+                self.mrcp_empirical_game = empirical_game
+                self.mrcp_profile = mrcp_mixed_strategy
+            print('iteration {} mrcp value {} profile {}'.format(self._mrcp_iteration,self.mrcp_value,self.mrcp_profile))
+            return self.mrcp_profile, self.mrcp_value
+
+        best = None
+        rng = self.restart_rng(empirical_game)
         for iters in range(repeat):
             # initiate_starting_point
-            mrcp_mixed_strategy, mrcp_value, iteration = self.no_derivative_opt_method(empirical_game, var='rand')
+            mrcp_mixed_strategy, mrcp_value, iteration = self.no_derivative_opt_method(empirical_game, var='rand', rng=rng)
+            if best is None or best[1] > mrcp_value:
+                best = (mrcp_mixed_strategy, mrcp_value, iteration)
             if self.mrcp_value > mrcp_value:
                 self.mrcp_value = mrcp_value
                 self._mrcp_iteration = iteration
                 self.mrcp_empirical_game = empirical_game
                 self.mrcp_profile = mrcp_mixed_strategy
+        if self.cache is not None:
+            self.cache.put('mrcp_amoeba', self.full_game, empirical_game, best)
         print('iteration {} mrcp value {} profile {}'.format(self._mrcp_iteration,self.mrcp_value,self.mrcp_profile))
         return self.mrcp_profile, self.mrcp_value
 
@@ -81,7 +231,7 @@ class minimum_regret_profile_calculator(object):
             empirical_game: the strategy set players have at this iteration of psro
         '''
         # first remove duplicate from empirical game
-        empirical_game = [sorted(list(set(ele))) for ele in empirical_game]
+        empirical_game = strategy_sets(empirical_game)
 
         strategy_indexes = [] # strategy combination for each player
         if self._last_empirical_game == None: # find all subgame indexes
@@ -121,7 +271,19 @@ class minimum_regret_profile_calculator(object):
         print("########################################")
         print("strategy set ",empirical_game, end = " ")
         print("has {} of new subgames".format(len(indexes)))
-        for ind in indexes:
+        self.num_pruned, self.num_solved = 0, 0
+        if self.branch_and_bound:
+            # promising supports first so that the incumbent tightens early
+            bounds = [regret_lower_bound(ind, self.full_game) for ind in indexes]
+            order = np.argsort(bounds, kind='stable')
+            indexes = [indexes[i] for i in order]
+            bounds = [bounds[i] for i in order]
+        for n, ind in enumerate(indexes):
+            if self.branch_and_bound and bounds[n] >= self.mrcp_value:
+                # bounds are sorted, no later subgame can beat the incumbent
+                self.num_pruned = len(indexes) - n
+                break
+            self.num_solved += 1
             mrcp_mixed_strategy, mrcp_value, iteration = self.no_derivative_opt_method(ind)
             if self.mrcp_value > mrcp_value:
                 self.mrcp_value = mrcp_value
@@ -136,5 +298,7 @@ class minimum_regret_profile_calculator(object):
                     self.mrcp_profile.append([mrcp_mixed_strategy[p][li_ind[p].index(ele)] if ele in li_ind[p] else 0 for ele in empirical_game[p]])
 
         self._last_empirical_game = empirical_game
+        if self.branch_and_bound:
+            print('solved {} subgames, pruned {}'.format(self.num_solved, self.num_pruned))
         print('iteration',self._mrcp_iteration,'mrcp profile',self.mrcp_profile)
         return self.mrcp_profile, self.mrcp_value
@@ -0,0 +1,95 @@
+import asyncio
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from nash_solver import subproc
+from nash_solver.gambit_tools import encode_gambit_string, decode_gambit_string, solve_pure_then_mixed
+
+"""
+This script provides a pool of gambit workers. Every solve streams the nfg over
+stdin and reads NE from stdout, with no fixed sleep and a per-call timeout.
+Each call runs in its own scratch directory, so solves from different threads
+or asyncio tasks never share payoffmatrix.nfg or nash.txt.
+"""
+
+class GambitSolverPool(object):
+    """
+    Run gambit solves concurrently. The gambit command line tools solve one game
+    per process, so workers are threads that each own a short-lived gambit
+    process at a time; the expensive parts of the old path (shell, files, sleep)
+    are gone.
+    """
+    def __init__(self, num_workers=4, method="lcp", method_pure_ne="enumpure", timeout=600, scratch_root=None):
+        """
+        Input:
+            num_workers   : maximum number of gambit processes alive at once
+            method        : gambit command line method for mixed NE
+            method_pure_ne: gambit command line method for pure NE
+            timeout       : default per-call timeout in seconds
+            scratch_root  : directory in which per-call scratch dirs are made
+        """
+        self.method = method
+        self.method_pure_ne = method_pure_ne
+        self.timeout = timeout
+        self.scratch_root = scratch_root
+        self._executor = ThreadPoolExecutor(max_workers=num_workers)
+
+    def _solve(self, meta_games, mode, timeout):
+        if np.shape(meta_games[0]) == (1,1):
+            return [np.array([1.]), np.array([1.])]
+        scratch = tempfile.mkdtemp(prefix="gambit_", dir=self.scratch_root)
+        try:
+            nfg = encode_gambit_string(meta_games)
+            timed_out = [False]
+            def run(pure):
+                command = ["gambit-" + self.method_pure_ne, "-q"] if pure else ["gambit-" + self.method, "-q", "-d", "8"]
+                nash_str, timed_out[0] = subproc.call_with_pipes(command, nfg, timeout, cwd=scratch)
+                return nash_str
+            nash_str, mode = solve_pure_then_mixed(mode, run)
+            if len(nash_str.strip()) == 0:
+                raise TimeoutError("gambit found no NE within {} seconds".format(timeout)) if timed_out[0] \
+                        else ValueError("gambit found no NE")
+            return decode_gambit_string(meta_games, nash_str, mode)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def submit(self, meta_games, mode="one", timeout=None):
+        """
+        Schedule a solve and return a concurrent.futures.Future of its NE.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return self._executor.submit(self._solve, meta_games, mode, timeout)
+
+    def solve(self, meta_games, mode="one", timeout=None):
+        """
+        Solve meta_games and block until gambit returns.
+        :param meta_games: meta-games in PSRO.
+        :param mode: "all", "pure", "one" options
+        :param timeout: Maximum time for this call, defaulted to the pool timeout.
+        :return: a list of NE, the same format as do_gambit_analysis.
+        """
+        return self.submit(meta_games, mode, timeout).result()
+
+    async def solve_async(self, meta_games, mode="one", timeout=None):
+        """
+        Awaitable version of solve for asyncio callers.
+        """
+        return await asyncio.wrap_future(self.submit(meta_games, mode, timeout))
+
+    def map(self, games, mode="one", timeout=None):
+        """
+        Solve a list of meta-games concurrently, results in input order.
+        """
+        futures = [self.submit(meta_games, mode, timeout) for meta_games in games]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -63,39 +63,46 @@ def product(shape, axes):
         prod_trans_ordered[axis] = prod_trans[i]
     return zip(*prod_trans_ordered)
 
+def encode_gambit_string(meta_games):
+    """
+    Encode a meta-game to the nfg text that gambit can recognize.
+    :param meta_games: A meta-game (payoff tensor) in PSRO.
+    :return: the content of an nfg file.
+    """
+    num_players = len(meta_games)
+    # Write header
+    lines = ['NFG 1 R "Empirical Game"\n']
+    name_players = '{ "p1"'
+    for i in range(2,num_players+1):
+        name_players += " " + "\"" + 'p' + str(i) + "\""
+    name_players += ' }'
+    lines.append(name_players)
+    # Write strategies
+    num_strs = '{ '
+    for i in np.shape(meta_games[0]):
+        num_strs += str(i) + " "
+    num_strs += '}'
+    lines.append(num_strs + '\n\n')
+    # Write outcomes
+    axes = tuple(reversed(range(num_players)))
+    for current_index in product(np.shape(meta_games[0]), axes):
+        for meta_game in meta_games:
+            lines.append(str(meta_game[tuple(current_index)]) + " ")
+    return "".join(lines)
+
 def encode_gambit_file(meta_games, checkpoint_dir=None):
     """
     Encode a meta-game to nfg file that gambit can recognize.
     :param meta_games: A meta-game (payoff tensor) in PSRO.
     """
-    num_players = len(meta_games)
     if checkpoint_dir is None:
         gambit_DIR = os.path.dirname(os.path.realpath(__file__)) + '/nfg'
     else:
         gambit_DIR = checkpoint_dir + '/nfg'
     gambit_NFG = gambit_DIR + '/payoffmatrix.nfg'
 
-    # Write header
     with open(gambit_NFG, "w") as nfgFile:
-        nfgFile.write('NFG 1 R "Empirical Game"\n')
-        name_players = '{ "p1"'
-        for i in range(2,num_players+1):
-            name_players += " " + "\"" + 'p' + str(i) + "\""
-        name_players += ' }'
-        nfgFile.write(name_players)
-        # Write strategies
-        num_strs = '{ '
-        range_iterators = []
-        for i in np.shape(meta_games[0]):
-            num_strs += str(i) + " "
-            range_iterators += [range(i)]
-        num_strs += '}'
-        nfgFile.write(num_strs + '\n\n')
-        # Write outcomes
-        axes = tuple(reversed(range(num_players)))
-        for current_index in product(np.shape(meta_games[0]), axes):
-            for meta_game in meta_games:
-                nfgFile.write(str(meta_game[tuple(current_index)]) + " ")
+        nfgFile.write(encode_gambit_string(meta_games))
 
 def gambit_analysis(timeout, method="gnm", checkpoint_dir=None):
     """
@@ -130,29 +137,20 @@ def gambit_analysis_pure(timeout, method="enumpure", checkpoint_dir=None):
     command_str = "gambit-" + method + " -q " + gambit_NFG + " > " + gambit_DIR + "/nash.txt"
     subproc.call_and_wait_with_timeout(command_str, timeout)
 
-def decode_gambit_file(meta_games, mode="all", max_num_nash=10, checkpoint_dir=None):
+def decode_gambit_string(meta_games, nash_str, mode="all", max_num_nash=10):
     """
-    Decode the results returned from gambit to a numpy format used for PSRO.
+    Decode the text printed by gambit to a numpy format used for PSRO.
     :param meta_games: A meta-game in PSRO.
+    :param nash_str: gambit output, one NE per line.
     :param mode: "all", "pure", "one" options
     :param max_num_nash: the number of NE considered to return
     :return: a list of NE
     """
-    if checkpoint_dir is None:
-        gambit_DIR = os.path.dirname(os.path.realpath(__file__)) + '/nfg'
-    else:
-        gambit_DIR = checkpoint_dir + '/nfg'
-
-    nash_DIR = gambit_DIR + '/nash.txt'
-    if not isExist(nash_DIR):
-        raise ValueError("nash.txt file does not exist!")
-    num_lines = file_len(nash_DIR)
-
-    # logging.info("Number of NE is ", num_lines)
+    lines = nash_str.splitlines()
+    num_lines = len(lines)
     if max_num_nash != None:
         if num_lines >= max_num_nash:
             num_lines = max_num_nash
-            # logging.info("Number of NE is constrained by the num_nash.")
 
     shape = np.shape(meta_games[0])
     slice_idx = []
@@ -162,23 +160,21 @@ def decode_gambit_file(meta_games, mode="all", max_num_nash=10, checkpoint_dir=N
         pos += shape[i]
 
     equilibria = []
-    with open(nash_DIR,'r') as f:
-        for _ in np.arange(num_lines):
-            equilibrim = []
-            nash = f.readline()
-            if len(nash.strip()) == 0:
-                continue
-            nash = nash[3:]
-            nash = nash.split(',')
-            new_nash = []
-            for j in range(len(nash)):
-                new_nash.append(convert(nash[j]))
-
-            new_nash = np.array(new_nash)
-            new_nash = np.round(new_nash, decimals=8)
-            for idx in slice_idx:
-                equilibrim.append(new_nash[idx])
-            equilibria.append(equilibrim)
+    for nash in lines[:num_lines]:
+        equilibrim = []
+        if len(nash.strip()) == 0:
+            continue
+        nash = nash[3:]
+        nash = nash.split(',')
+        new_nash = []
+        for j in range(len(nash)):
+            new_nash.append(convert(nash[j]))
+
+        new_nash = np.array(new_nash)
+        new_nash = np.round(new_nash, decimals=8)
+        for idx in slice_idx:
+            equilibrim.append(new_nash[idx])
+        equilibria.append(equilibrim)
 
     if mode == "all" or mode == "pure":
         return equilibria
@@ -188,8 +184,61 @@ def decode_gambit_file(meta_games, mode="all", max_num_nash=10, checkpoint_dir=N
         # logging.info("mode is beyond all/pure/one.")
         raise ValueError
 
+def decode_gambit_file(meta_games, mode="all", max_num_nash=10, checkpoint_dir=None):
+    """
+    Decode the results returned from gambit to a numpy format used for PSRO.
+    :param meta_games: A meta-game in PSRO.
+    :param mode: "all", "pure", "one" options
+    :param max_num_nash: the number of NE considered to return
+    :return: a list of NE
+    """
+    if checkpoint_dir is None:
+        gambit_DIR = os.path.dirname(os.path.realpath(__file__)) + '/nfg'
+    else:
+        gambit_DIR = checkpoint_dir + '/nfg'
+
+    nash_DIR = gambit_DIR + '/nash.txt'
+    if not isExist(nash_DIR):
+        raise ValueError("nash.txt file does not exist!")
+    with open(nash_DIR,'r') as f:
+        nash_str = f.read()
+    return decode_gambit_string(meta_games, nash_str, mode, max_num_nash)
+
+def gambit_analysis_pipe(meta_games, timeout, method="lcp", pure=False, cwd=None):
+    """
+    Stream the nfg of meta_games to gambit over stdin and read NE from stdout.
+    Nothing is shared on disk, so calls can run concurrently.
+    :param meta_games: meta-games in PSRO.
+    :param timeout: Maximum time for the subprocess.
+    :param method: The gamebit command line method.
+    :param pure: run the pure NE method, which does not take the -d option.
+    :param cwd: scratch directory the subprocess runs in.
+    :return: gambit output, one NE per line.
+    """
+    command = ["gambit-" + method, "-q"]
+    if not pure:
+        command += ["-d", "8"]
+    nash_str, _ = subproc.call_with_pipes(command, encode_gambit_string(meta_games), timeout, cwd=cwd)
+    return nash_str
 
-def do_gambit_analysis(meta_games, mode, timeout = 600, method="lcp", method_pure_ne="enumpure", checkpoint_dir=None):
+def solve_pure_then_mixed(mode, run):
+    """
+    Run gambit for mode, falling back to mixed NE when mode is "pure" and the
+    game has no pure NE. Shared by do_gambit_analysis and GambitSolverPool.
+    :param mode: "all", "pure", "one" options
+    :param run: function of pure (bool) running the pure or the mixed NE
+        method and returning gambit's output.
+    :return: gambit output and the mode to decode it with.
+    """
+    if mode == 'pure':
+        nash_str = run(True)
+        if len(nash_str.strip()) != 0:
+            return nash_str, mode
+        # If there is no pure NE, find mixed NE.
+        mode = 'all'
+    return run(False), mode
+
+def do_gambit_analysis(meta_games, mode, timeout = 600, method="lcp", method_pure_ne="enumpure", checkpoint_dir=None, use_pipes=True):
     """
     Combine encoder and decoder.
     :param meta_games: meta-games in PSRO.
@@ -197,8 +246,25 @@ def do_gambit_analysis(meta_games, mode, timeout = 600, method="lcp", method_pur
     :param timeout: Maximum time for the subprocess
     :param method: The gamebit command line method.
     :param method_pure_ne: The gamebit command line method for finding pure NE.
+    :param use_pipes: stream the game over stdin/stdout instead of the shared
+        payoffmatrix.nfg and nash.txt files in checkpoint_dir.
     :return: a list of NE.
     """
+    if np.shape(meta_games[0]) == (1,1):
+        return [np.array([1.]), np.array([1.])]
+
+    if use_pipes:
+        while True:
+            nash_str, mode = solve_pure_then_mixed(
+                    mode, lambda pure: gambit_analysis_pipe(meta_games, timeout, method_pure_ne if pure else method, pure=pure))
+            equilibria = decode_gambit_string(meta_games, nash_str, mode) if len(nash_str.strip()) != 0 else []
+            if len(equilibria) != 0:
+                break
+            timeout += 120
+            if timeout > 7200:
+                raise ValueError
+        return equilibria
+
     if checkpoint_dir is None:
         gambit_DIR = os.path.dirname(os.path.realpath(__file__)) + '/nfg'
     else:
@@ -206,25 +272,21 @@ def do_gambit_analysis(meta_games, mode, timeout = 600, method="lcp", method_pur
     if not isExist(gambit_DIR) and not checkpoint_dir is None:
         mkdir(gambit_DIR)
 
-    if np.shape(meta_games[0]) == (1,1):
-        return [np.array([1.]), np.array([1.])]
-
     encode_gambit_file(meta_games, checkpoint_dir)
-    while True:
-        if mode == 'pure':
+    def run(pure):
+        if pure:
             gambit_analysis_pure(timeout, method_pure_ne, checkpoint_dir)
         else:
             gambit_analysis(timeout, method, checkpoint_dir)
-        # If there is no pure NE, find mixed NE.
         nash_DIR = gambit_DIR + '/nash.txt'
         if not isExist(nash_DIR):
             raise ValueError("nash.txt file does not exist!")
-        num_lines = file_len(nash_DIR)
-        if num_lines == 0:
-            # logging.info("Pure NE does not exist. Return mixed NE.")
-            mode = 'all'
-            continue
-        equilibria = decode_gambit_file(meta_games, mode, checkpoint_dir=checkpoint_dir)
+        with open(nash_DIR, 'r') as f:
+            return f.read()
+
+    while True:
+        nash_str, mode = solve_pure_then_mixed(mode, run)
+        equilibria = decode_gambit_string(meta_games, nash_str, mode) if len(nash_str.strip()) != 0 else []
         if len(equilibria) != 0:
             break
         timeout += 120
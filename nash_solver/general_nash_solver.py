@@ -20,11 +20,11 @@ from __future__ import absolute_import
 from __future__ import division
 # from __future__ import logging.info_function
 
-import fractions
+import collections
+import hashlib
 import itertools
 import os
 import subprocess
-import tempfile
 import warnings
 
 import numpy as np
@@ -47,6 +47,7 @@ def renormalize(probabilities):
 
 @np.vectorize
 def _to_fraction_str(x, lrsnash_max_denom=1000):
+    import fractions
     return str(fractions.Fraction(x).limit_denominator(lrsnash_max_denom))
 
 
@@ -60,6 +61,9 @@ def lrs_solve(row_payoffs, col_payoffs, lrsnash_path):
     Yields:
       (row_mixture, col_mixture), numpy vectors of float64s.
     """
+    # only needed by lrsnash, kept out of the import of every solver
+    import fractions
+    import tempfile
     num_rows, num_cols = row_payoffs.shape
     game_file, game_file_path = tempfile.mkstemp()
     try:
@@ -143,13 +147,193 @@ def lemke_howson_solve(row_payoffs, col_payoffs):
     finally:
         warnings.showwarning = showwarning
 
-def gambit_solve(meta_games, mode, checkpoint_dir):
+def _initialize_tableaux(row_payoffs, col_payoffs, shift=True):
+    """
+    Build the two Lemke-Howson tableaux of a bimatrix game.
+    Labels 0..m-1 are the row player's strategies and labels m..m+n-1 the
+    column player's. Tableau 0 holds the row player's polytope {x: B^T x <= 1},
+    tableau 1 the column player's polytope {y: A y <= 1}. Payoffs are shifted
+    to be strictly positive, which leaves the equilibria unchanged.
+    :param row_payoffs: payoffs for row player, shape (m, n).
+    :param col_payoffs: payoffs for column player, shape (m, n).
+    :param shift: set to False if the payoffs are already strictly positive.
+    :return: tableaux and the basic variable (label) of every tableau row.
+    """
+    if shift:
+        row_payoffs = row_payoffs - np.min(row_payoffs) + 1
+        col_payoffs = col_payoffs - np.min(col_payoffs) + 1
+    m, n = np.shape(row_payoffs)
+    tableaux = (np.zeros((n, m + n + 1)), np.zeros((m, m + n + 1)))
+    tableaux[0][:, :m] = np.transpose(col_payoffs)
+    tableaux[0][:, m:m + n] = np.eye(n)
+    tableaux[1][:, :m] = np.eye(m)
+    tableaux[1][:, m:m + n] = row_payoffs
+    tableaux[0][:, -1] = 1
+    tableaux[1][:, -1] = 1
+    bases = (np.arange(m, m + n), np.arange(m))
+    return tableaux, bases
+
+def _lex_min_ratio_test(tableau, pivot, slack_start, tol=1e-10):
+    """
+    Find the leaving row for the entering column pivot. Ties of the ordinary
+    ratio test are broken lexicographically on the slack columns, which makes
+    the pivoting well defined on degenerate games.
+    :param tableau: tableau to pivot on.
+    :param pivot: entering column.
+    :param slack_start: first column of the slack (initially identity) block.
+    :return: row index, or -1 if the column has no positive entry.
+    """
+    column = tableau[:, pivot]
+    candidates = np.nonzero(column > tol)[0]
+    if len(candidates) == 0:
+        return -1
+    num_rows = tableau.shape[0]
+    for col in [-1] + list(range(slack_start, slack_start + num_rows)):
+        ratios = tableau[candidates, col] / column[candidates]
+        candidates = candidates[ratios <= np.min(ratios) + tol]
+        if len(candidates) == 1:
+            break
+    return candidates[0]
+
+def _pivoting(tableau, pivot, row):
+    """
+    Perform a pivoting step on tableau in place.
+    :param tableau: tableau to pivot on.
+    :param pivot: entering column.
+    :param row: leaving row.
+    """
+    column = tableau[:, pivot].copy()
+    column[row] = 0
+    tableau[row] /= tableau[row, pivot]
+    tableau -= np.outer(column, tableau[row])
+
+def _get_mixed_actions(tableaux, bases):
+    """
+    Read the normalized mixed strategies off the final tableaux.
+    """
+    m, n = tableaux[1].shape[0], tableaux[0].shape[0]
+    out = np.zeros(m + n)
+    for player, (start, stop) in enumerate([(0, m), (m, m + n)]):
+        for row, label in enumerate(bases[player]):
+            if start <= label < stop:
+                out[label] = tableaux[player][row, -1]
+        total = np.sum(out[start:stop])
+        if total > 0:
+            out[start:stop] /= total
+    return out[:m], out[m:]
+
+def _lemke_howson_path(tableaux, bases, init_label, max_iter):
+    """
+    Follow the Lemke-Howson path dropping init_label, pivoting tableaux and
+    bases in place.
+    :return: True if the path ends at an equilibrium within max_iter pivots.
+    """
+    m = tableaux[1].shape[0]
+    slack_starts = (m, 0)
+    player = 0 if init_label < m else 1
+    pivot = init_label
+    for _ in range(max_iter):
+        row = _lex_min_ratio_test(tableaux[player], pivot, slack_starts[player])
+        if row < 0:
+            return False
+        _pivoting(tableaux[player], pivot, row)
+        bases[player][row], pivot = pivot, bases[player][row]
+        if pivot == init_label:
+            return True
+        player = 1 - player
+    return False
+
+def lemke_howson(row_payoffs, col_payoffs, init_label=0, max_iter=10**6):
+    """
+    Find one NE with a pure NumPy Lemke-Howson algorithm, starting from the
+    artificial equilibrium and dropping init_label. No subprocess or file is used.
+    :param row_payoffs: payoffs for row player
+    :param col_payoffs: payoffs for column player
+    :param init_label: label dropped at the start, in range(m + n).
+    :param max_iter: maximum number of pivots.
+    :return: (row_mixture, col_mixture), or None if max_iter is exceeded.
+    """
+    tableaux, bases = _initialize_tableaux(row_payoffs, col_payoffs)
+    if not _lemke_howson_path(tableaux, bases, init_label, max_iter):
+        return None
+    return _get_mixed_actions(tableaux, bases)
+
+def is_nash(meta_games, equilibrium, tol=1e-7):
+    """
+    Check that no player in a two-player game gains more than tol by deviating.
+    :param meta_games: meta-games in PSRO.
+    :param equilibrium: [row_mixture, col_mixture]
+    :return: bool
+    """
+    row_mixture, col_mixture = equilibrium
+    row_values = np.dot(meta_games[0], col_mixture)
+    col_values = np.dot(row_mixture, meta_games[1])
+    return np.max(row_values) - np.dot(row_mixture, row_values) <= tol and \
+        np.max(col_values) - np.dot(col_values, col_mixture) <= tol
+
+def lemke_howson_enumeration(row_payoffs, col_payoffs, labels=None):
+    """
+    Run Lemke-Howson from multiple starting labels and yield every distinct
+    equilibrium found. Paths that fail or end at a point that is not an
+    equilibrium (numerical trouble) are skipped.
+    :param labels: starting labels to try, defaulted to all m + n labels.
+    Yields:
+      (row_mixture, col_mixture), numpy vectors of float64s.
+    """
+    m, n = np.shape(row_payoffs)
+    labels = range(m + n) if labels is None else labels
+    found = []
+    for label in labels:
+        equilibrium = lemke_howson(row_payoffs, col_payoffs, init_label=label)
+        if equilibrium is None:
+            continue
+        equilibrium = normalize_ne(list(equilibrium))
+        if not is_nash([row_payoffs, col_payoffs], equilibrium):
+            continue
+        if any(np.allclose(equilibrium[0], eq[0]) and np.allclose(equilibrium[1], eq[1]) for eq in found):
+            continue
+        found.append(equilibrium)
+        yield equilibrium
+
+def lemke_howson_solve_numpy(meta_games, mode="one", max_num_nash=10):
+    """
+    In-process replacement of do_gambit_analysis for two-player games.
+    Results have the same format as gambit: [p0_probs, p1_probs] for mode
+    "one" and a list of those for modes "all" and "pure".
+    :param meta_games: meta-games in PSRO.
+    :param mode: options "all", "one", "pure"
+    :param max_num_nash: the number of NE considered to return
+    :return: NE, or None if every starting label failed.
+    """
+    if mode == "pure":
+        equilibria = pure_ne_solve(meta_games)
+        if len(equilibria) != 0:
+            return equilibria
+        mode = "all"
+    equilibria = lemke_howson_enumeration(meta_games[0], meta_games[1])
+    if mode == "one":
+        return next(equilibria, None)
+    elif mode == "all":
+        equilibria = list(itertools.islice(equilibria, max_num_nash))
+        return equilibria if len(equilibria) != 0 else None
+    else:
+        raise ValueError("Please choose a valid mode.")
+
+def gambit_solve(meta_games, mode, checkpoint_dir, backend="lemke_howson"):
     """
     Find NE using gambit.
     :param meta_games: meta-games in PSRO.
     :param mode: options "all", "one", "pure"
+    :param backend: "lemke_howson" solves two-player games in-process with
+        lemke_howson_solve_numpy and only calls gambit if it fails, "gambit"
+        always runs the gambit subprocess.
     :return: a list of NE.
     """
+    if backend == "lemke_howson" and len(meta_games) == 2:
+        equilibria = lemke_howson_solve_numpy(meta_games, mode)
+        if equilibria is not None:
+            return equilibria
+        logging.warning("Lemke-Howson failed from every label, falling back to gambit.")
     return do_gambit_analysis(meta_games, mode, checkpoint_dir=checkpoint_dir)
 
 def pure_ne_solve(meta_games, tol=1e-7):
@@ -175,6 +359,138 @@ def pure_ne_solve(meta_games, tol=1e-7):
         pure_ne.append([p1_ne, p2_ne])
     return pure_ne
 
+def zero_sum_lp_solve(meta_games):
+    """
+    Exact NE of a two-player zero-sum game from the maximin linear program of
+    each player: max v s.t. A^T x >= v, x in simplex for the row player and
+    min w s.t. A y <= w, y in simplex for the column player.
+    :param meta_games: meta-games in PSRO, meta_games[1] == -meta_games[0].
+    :return: [p0_probs, p1_probs], or None if the LP solver fails.
+    """
+    from scipy.optimize import linprog
+    payoffs = meta_games[0]
+    equilibrium = []
+    # the row player maximizes over A^T, the column player minimizes over A
+    for dev_payoffs in [-payoffs.T, payoffs]:
+        num_dev, k = dev_payoffs.shape
+        res = linprog(c=np.append(np.zeros(k), 1),
+                      A_ub=np.hstack([dev_payoffs, -np.ones((num_dev, 1))]),
+                      b_ub=np.zeros(num_dev),
+                      A_eq=np.append(np.ones(k), 0)[None, :],
+                      b_eq=[1],
+                      bounds=[(0, None)] * k + [(None, None)],
+                      method='highs')
+        if res.status != 0:
+            return None
+        equilibrium.append(renormalize(res.x[:k]))
+    return equilibrium
+
+def two_by_two_solve(meta_games):
+    """
+    The fully mixed NE of a 2x2 game without a pure NE, in closed form: each
+    player mixes so that the other is indifferent between its two strategies.
+    :param meta_games: meta-games in PSRO.
+    :return: [p0_probs, p1_probs], or None if the game has no fully mixed NE.
+    """
+    row_payoffs, col_payoffs = meta_games[0], meta_games[1]
+    row_denominator = col_payoffs[0, 0] - col_payoffs[1, 0] - col_payoffs[0, 1] + col_payoffs[1, 1]
+    col_denominator = row_payoffs[0, 0] - row_payoffs[0, 1] - row_payoffs[1, 0] + row_payoffs[1, 1]
+    if row_denominator == 0 or col_denominator == 0:
+        return None
+    p = (col_payoffs[1, 1] - col_payoffs[1, 0]) / row_denominator
+    q = (row_payoffs[1, 1] - row_payoffs[0, 1]) / col_denominator
+    if not (0 <= p <= 1 and 0 <= q <= 1):
+        return None
+    return [np.array([p, 1 - p]), np.array([q, 1 - q])]
+
+
+class NashDispatcher(object):
+    """
+    Pick the cheapest exact solver for each two-player restricted game and
+    record which one served every call. In order:
+        "single_strategy": a player has one strategy, the other best responds
+        "pure"           : a pure NE, found by the vectorized pure_ne_solve
+        "2x2"            : closed form of a 2x2 game without pure NE
+        "zero_sum_lp"    : one LP per player for zero-sum games of at least
+                           lp_min_size strategies in total
+        "lemke_howson"   : in-process Lemke-Howson
+        "gambit"         : the gambit subprocess, as a last resort
+    Games of more than two players go to gambit directly.
+    """
+    def __init__(self, tol=1e-7, lp_min_size=96):
+        """
+        :param tol: tolerance of the pure NE and zero-sum checks.
+        :param lp_min_size: smallest num_rows + num_cols solved by LP. Below it the
+            overhead of the LP solver makes in-process Lemke-Howson faster, they
+            break even around 45 x 45.
+        """
+        self.tol = tol
+        self.lp_min_size = lp_min_size
+        self.counts = collections.Counter()
+        self.last_backend = None
+
+    def _record(self, backend, equilibria):
+        self.counts[backend] += 1
+        self.last_backend = backend
+        return equilibria
+
+    def solve_structured(self, meta_games, zero_sum=None):
+        """
+        One NE of a two-player game from the solvers that need no pivoting:
+        single strategy, pure NE, 2x2 closed form and, for large enough
+        zero-sum games, the LP.
+        :param meta_games: meta-games in PSRO.
+        :param zero_sum: whether the game is zero-sum, checked if None.
+        :return: [p0_probs, p1_probs], or None if none of them applies.
+        """
+        num_rows, num_cols = np.shape(meta_games[0])
+        if num_rows == 1 or num_cols == 1:
+            row = np.argmax(meta_games[0][:, 0]) if num_cols == 1 else 0
+            col = np.argmax(meta_games[1][0, :]) if num_rows == 1 else 0
+            return self._record("single_strategy", [np.eye(num_rows)[row], np.eye(num_cols)[col]])
+        pure_ne = pure_ne_solve(meta_games, tol=self.tol)
+        if len(pure_ne) != 0:
+            return self._record("pure", pure_ne[0])
+        if num_rows == 2 and num_cols == 2:
+            equilibrium = two_by_two_solve(meta_games)
+            if equilibrium is not None:
+                return self._record("2x2", equilibrium)
+        if num_rows + num_cols >= self.lp_min_size and zero_sum is None:
+            zero_sum = np.allclose(meta_games[0], -meta_games[1], rtol=0, atol=self.tol)
+        if num_rows + num_cols >= self.lp_min_size and zero_sum:
+            equilibrium = zero_sum_lp_solve(meta_games)
+            if equilibrium is not None:
+                return self._record("zero_sum_lp", equilibrium)
+        return None
+
+    def __call__(self, meta_games, mode="one", checkpoint_dir=None, zero_sum=None):
+        """
+        :param meta_games: meta-games in PSRO.
+        :param mode: options "all", "one", "pure", with the return format of gambit_solve.
+        :param checkpoint_dir: path to gambit files.
+        :param zero_sum: whether the game is zero-sum, checked if None.
+        :return: NE
+        """
+        if len(meta_games) != 2:
+            return self._record("gambit", do_gambit_analysis(meta_games, mode, checkpoint_dir=checkpoint_dir))
+        if mode == "one":
+            equilibrium = self.solve_structured(meta_games, zero_sum)
+            if equilibrium is not None:
+                return equilibrium
+        elif mode == "pure":
+            pure_ne = pure_ne_solve(meta_games, tol=self.tol)
+            if len(pure_ne) != 0:
+                return self._record("pure", pure_ne)
+            mode = "all"
+        equilibria = lemke_howson_solve_numpy(meta_games, mode)
+        if equilibria is not None:
+            return self._record("lemke_howson", equilibria)
+        logging.warning("Lemke-Howson failed from every label, falling back to gambit.")
+        return self._record("gambit", do_gambit_analysis(meta_games, mode, checkpoint_dir=checkpoint_dir))
+
+# shared by callers that do not keep a solver of their own
+nash_dispatcher = NashDispatcher()
+
 # def nash_solver(meta_games,
 #                 solver,
 #                 mode="one",
@@ -263,3 +579,289 @@ def normalize_ne(eq):
     for p in range(len(eq)):
         eq[p] = renormalize(eq[p])
     return eq
+
+class IncrementalNashSolver(object):
+    """
+    Warm-started NE solver for a two-player restricted game that grows as PSRO
+    adds strategies. The restricted game is the LCP w + P z = 1, w, z >= 0,
+    w.z = 0 of the Lemke-Howson polytopes, where P holds the payoffs shifted by
+    a constant of the full game. The complementary basis and tableau of the
+    last equilibrium are kept between calls. When strategies are added, only
+    the new rows and columns of the tableau are computed and the old basis
+    plus the new slacks is the starting basis: if the new strategies are no
+    profitable deviation the old equilibrium is returned without a pivot,
+    otherwise Lemke's method covers the violated rows with an artificial
+    variable and pivots from there. The work per call grows with the change
+    and not with the restricted game. A cold Lemke-Howson is used on the
+    first call and whenever a warm path fails.
+    Before any pivoting, the structural solvers of NashDispatcher are tried:
+    single strategy, pure NE, 2x2 closed form and the LP of large zero-sum
+    games. They leave the basis as it is, the next warm start extends it by
+    all strategies added since.
+    """
+    def __init__(self, meta_games, max_iter=10**5, tol=1e-9, payoff_min=None, zero_sum=None, dispatcher=None):
+        """
+        Input:
+            meta_games: the full two-player game restricted games are taken from
+            max_iter  : maximum number of pivots of a warm start
+            tol       : pivoting tolerance
+            payoff_min: smallest payoff of each player, e.g. from the GameStore
+                        catalog entry of meta_games. Taken from meta_games when
+                        not given.
+            zero_sum  : whether meta_games is zero-sum, e.g. from the catalog.
+                        Restricted games are checked when not given.
+            dispatcher: the NashDispatcher whose structural solvers are tried
+                        first, a new one if not given
+        """
+        assert len(meta_games) == 2, 'incremental solver only works for two-player games'
+        self.meta_games = meta_games
+        self.max_iter = max_iter
+        self.tol = tol
+        self.zero_sum = zero_sum
+        self.dispatcher = NashDispatcher() if dispatcher is None else dispatcher
+        # backend that served the last call: one of NashDispatcher's, or
+        # "incremental" for a warm start and "lemke_howson" for a cold one
+        self.last_backend = None
+        # one constant per player for the whole run, so that tableaux
+        # stay valid as the restricted game grows
+        if payoff_min is None:
+            payoff_min = [np.min(meta_game) for meta_game in meta_games]
+        self._shifts = [1 - minimum for minimum in payoff_min]
+        self.clear()
+
+    def clear(self):
+        """
+        Forget the restricted game, call at the start of every PSRO round.
+        """
+        self._slot_player = np.zeros(0, dtype=int)    # player of every LCP slot
+        self._slot_strategy = np.zeros(0, dtype=int)  # strategy of every LCP slot
+        self._tableau = None  # [w | z | rhs] in the current basis
+        self._basis = None    # basic column of every row, w_s is s and z_s is K+s
+        self.num_pivots = 0
+        self.warm_starts = 0
+        self.cold_starts = 0
+
+    def state(self):
+        """
+        Copy of what the next call depends on besides its restricted game, to
+        be cached along with an equilibrium.
+        """
+        tableau = None if self._tableau is None else self._tableau.copy()
+        basis = None if self._basis is None else self._basis.copy()
+        return (self._slot_player.copy(), self._slot_strategy.copy(), tableau, basis)
+
+    def restore(self, state):
+        """
+        Continue from a state, as if the calls that led to it had been made.
+        """
+        slot_player, slot_strategy, tableau, basis = state
+        self._slot_player, self._slot_strategy = slot_player.copy(), slot_strategy.copy()
+        self._tableau = None if tableau is None else tableau.copy()
+        self._basis = None if basis is None else basis.copy()
+
+    def fingerprint(self):
+        """
+        Digest of the state: slots, basis and tableau, byte for byte, so that
+        two solvers with the same fingerprint give the same next equilibrium
+        of a restricted game. "cold" before the first warm-startable solve.
+        """
+        if self._tableau is None:
+            return "cold"
+        sha = hashlib.sha1()
+        for array in [self._slot_player, self._slot_strategy, self._basis, self._tableau]:
+            sha.update(np.ascontiguousarray(array).tobytes())
+        return sha.hexdigest()
+
+    def _payoff_block(self, rows, cols):
+        """
+        Entries P[rows, cols] of the LCP matrix P = [[0, A], [B^T, 0]].
+        """
+        block = np.zeros((len(rows), len(cols)))
+        row_player, col_player = self._slot_player[rows], self._slot_player[cols]
+        row_strategy, col_strategy = self._slot_strategy[rows], self._slot_strategy[cols]
+        r, c = np.nonzero(np.logical_and.outer(row_player == 0, col_player == 1))
+        block[r, c] = self.meta_games[0][row_strategy[r], col_strategy[c]] + self._shifts[0]
+        r, c = np.nonzero(np.logical_and.outer(row_player == 1, col_player == 0))
+        block[r, c] = self.meta_games[1][col_strategy[c], row_strategy[r]] + self._shifts[1]
+        return block
+
+    def _extend_tableau(self, num_new):
+        """
+        Add the last num_new slots to the tableau. Their w's join the basis,
+        so the old rows only gain the new z columns and the new rows are
+        eliminated against the old basis.
+        """
+        K_new = len(self._slot_player)
+        K = K_new - num_new
+        old, new = np.arange(K), np.arange(K, K_new)
+        T_w, T_z, rhs = self._tableau[:, :K], self._tableau[:, K:2 * K], self._tableau[:, -1]
+        P_on = self._payoff_block(old, new)
+        P_no = self._payoff_block(new, old)
+        P_nn = self._payoff_block(new, new)
+
+        # new-row entries of the old basic columns
+        C_b = np.zeros((num_new, K))
+        is_z = self._basis >= K
+        C_b[:, is_z] = P_no[:, self._basis[is_z] - K]
+
+        top_new_z = np.dot(T_w, P_on)
+        tableau = np.zeros((K_new, 2 * K_new + 1))
+        tableau[:K, :K] = T_w
+        tableau[:K, K_new:K_new + K] = T_z
+        tableau[:K, K_new + K:2 * K_new] = top_new_z
+        tableau[:K, -1] = rhs
+        tableau[K:, :K] = -np.dot(C_b, T_w)
+        tableau[K:, K:K_new] = np.eye(num_new)
+        tableau[K:, K_new:K_new + K] = P_no - np.dot(C_b, T_z)
+        tableau[K:, K_new + K:2 * K_new] = P_nn - np.dot(C_b, top_new_z)
+        tableau[K:, -1] = 1 - np.dot(C_b, rhs)
+        basis = self._basis.copy()
+        basis[is_z] += num_new
+        self._tableau = tableau
+        self._basis = np.concatenate([basis, new])
+
+    def _lex_min(self, tableau, candidates, column):
+        """
+        Lexicographic minimum over candidate rows of (rhs, B^-1) / column.
+        """
+        K = len(self._basis)
+        for col in [-1] + list(range(K)):
+            ratios = tableau[candidates, col] / column[candidates]
+            candidates = candidates[ratios <= np.min(ratios) + self.tol]
+            if len(candidates) == 1:
+                break
+        return candidates[0]
+
+    def _lemke(self):
+        """
+        Lemke's method from the current complementary basis. Rows that are
+        lexicographically infeasible are covered by the artificial variable z0.
+        :return: True if z0 left the basis within max_iter pivots.
+        """
+        K = len(self._basis)
+        # (rhs, B^-1) rows, B^-1 being the w columns
+        lex = np.hstack([self._tableau[:, -1:], self._tableau[:, :K]])
+        nonzero = np.abs(lex) > self.tol
+        leading = lex[np.arange(K), np.argmax(nonzero, axis=1)]
+        infeasible = np.nonzero(np.any(nonzero, axis=1) & (leading < 0))[0]
+        if len(infeasible) == 0:
+            return True
+
+        z0 = 2 * K
+        covering = np.zeros((K, 1))
+        covering[infeasible] = -1
+        tableau = np.hstack([self._tableau[:, :-1], covering, self._tableau[:, -1:]])
+        row = self._lex_min(tableau, infeasible, np.ones(K))
+        entering = z0
+        for _ in range(self.max_iter):
+            leaving = self._basis[row]
+            _pivoting(tableau, entering, row)
+            self._basis[row] = entering
+            self.num_pivots += 1
+            if leaving == z0:
+                self._tableau = np.hstack([tableau[:, :z0], tableau[:, -1:]])
+                return True
+            entering = leaving + K if leaving < K else leaving - K
+            candidates = np.nonzero(tableau[:, entering] > self.tol)[0]
+            if len(candidates) == 0:
+                return False
+            row = self._lex_min(tableau, candidates, tableau[:, entering])
+        return False
+
+    def _equilibrium(self):
+        K = len(self._basis)
+        z = np.zeros(K)
+        is_z = self._basis >= K
+        z[self._basis[is_z] - K] = np.maximum(self._tableau[is_z, -1], 0)
+        return [z[self._slot_player == p] for p in range(2)]
+
+    def _cold_start(self, idx0, idx1):
+        """
+        Solve with Lemke-Howson from multiple labels and keep the basis, the
+        LH labels being the LCP slots: idx0 first, then idx1.
+        """
+        self._slot_player = np.array([0] * len(idx0) + [1] * len(idx1), dtype=int)
+        self._slot_strategy = np.array(list(idx0) + list(idx1), dtype=int)
+        self._tableau, self._basis = None, None
+        self.cold_starts += 1
+        self.last_backend = "lemke_howson"
+        m, n = len(idx0), len(idx1)
+        K = m + n
+        subgames = [meta_game[np.ix_(idx0, idx1)] for meta_game in self.meta_games]
+        for label in range(K):
+            tableaux, bases = _initialize_tableaux(subgames[0] + self._shifts[0],
+                                                   subgames[1] + self._shifts[1],
+                                                   shift=False)
+            if not _lemke_howson_path(tableaux, bases, label, 10**6):
+                continue
+            equilibrium = normalize_ne(list(_get_mixed_actions(tableaux, bases)))
+            if not is_nash(subgames, equilibrium):
+                continue
+            # assemble the LCP tableau from the two LH tableaux:
+            # tableau 0 is [x | s] = [z_0..z_m-1 | w_m..w_K-1]
+            # tableau 1 is [r | y] = [w_0..w_m-1 | z_m..z_K-1]
+            tableau = np.zeros((K, 2 * K + 1))
+            tableau[:n, K:K + m] = tableaux[0][:, :m]
+            tableau[:n, m:K] = tableaux[0][:, m:K]
+            tableau[:n, -1] = tableaux[0][:, -1]
+            tableau[n:, :m] = tableaux[1][:, :m]
+            tableau[n:, K + m:2 * K] = tableaux[1][:, m:K]
+            tableau[n:, -1] = tableaux[1][:, -1]
+            basis = np.concatenate([np.where(bases[0] < m, bases[0] + K, bases[0]),
+                                    np.where(bases[1] < m, bases[1], bases[1] + K)])
+            self._tableau, self._basis = tableau, basis
+            return equilibrium
+        logging.warning("Lemke-Howson failed from every label, falling back to gambit.")
+        self.last_backend = "gambit"
+        return gambit_solve(subgames, mode="one", checkpoint_dir=None, backend="gambit")
+
+    def __call__(self, idx0, idx1):
+        """
+        Solve the restricted game on strategies idx0 x idx1.
+        Input:
+            idx0, idx1: sorted strategy indexes of the restricted game
+        Output:
+            [p0_probs, p1_probs] aligned with idx0 and idx1
+        """
+        subgames = [meta_game[np.ix_(idx0, idx1)] for meta_game in self.meta_games]
+        equilibrium = self.dispatcher.solve_structured(subgames, self.zero_sum)
+        if equilibrium is not None:
+            self.last_backend = self.dispatcher.last_backend
+            return equilibrium
+
+        strategies = [list(idx0), list(idx1)]
+        known = [set(self._slot_strategy[self._slot_player == p]) for p in range(2)]
+        equilibrium = None
+        if self._tableau is not None and all(known[p].issubset(strategies[p]) for p in range(2)):
+            new = [[s for s in strategies[p] if s not in known[p]] for p in range(2)]
+            num_new = len(new[0]) + len(new[1])
+            if num_new != 0:
+                self._slot_player = np.concatenate([self._slot_player, [0] * len(new[0]), [1] * len(new[1])]).astype(int)
+                self._slot_strategy = np.concatenate([self._slot_strategy, new[0], new[1]]).astype(int)
+                self._extend_tableau(num_new)
+            self.warm_starts += 1
+            self.last_backend = "incremental"
+            if self._lemke():
+                equilibrium = self._equilibrium()
+                if np.sum(equilibrium[0]) == 0 or np.sum(equilibrium[1]) == 0:
+                    equilibrium = None
+                else:
+                    equilibrium = normalize_ne(equilibrium)
+                    # accepted on the same check as a cold start, in slot order
+                    slots = [self._slot_strategy[self._slot_player == p] for p in range(2)]
+                    subgames = [meta_game[np.ix_(*slots)] for meta_game in self.meta_games]
+                    if not is_nash(subgames, equilibrium):
+                        equilibrium = None
+            if equilibrium is None:
+                logging.info("warm start failed, solving the restricted game from scratch")
+
+        if equilibrium is None:
+            equilibrium = self._cold_start(*strategies)
+
+        # from slot order back to the sorted order of idx0, idx1
+        nash = []
+        for p in range(2):
+            slot_strategies = self._slot_strategy[self._slot_player == p]
+            position = {s: i for i, s in enumerate(slot_strategies)}
+            nash.append(np.array([equilibrium[p][position[s]] for s in strategies[p]]))
+        return nash
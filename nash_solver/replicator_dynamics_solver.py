@@ -54,78 +54,279 @@ def _partial_multi_dot(player_payoff_tensor, strategies, index_avoided):
 
 
 
-def _replicator_dynamics_step(payoff_tensors, strategies, dt):
-  """Does one step of the projected replicator dynamics algorithm.
+def _exploitability(payoff_tensors, strategies):
+  """Computes the NashConv of a profile: total gain from best responding.
 
   Args:
     payoff_tensors: List of payoff tensors for each player.
     strategies: List of the strategies used by each player.
-    dt: Update amplitude term.
-    gamma: Minimum exploratory probability term.
 
   Returns:
-    A list of updated strategies for each player.
+    Sum over players of best response value minus the profile's value.
   """
-
-  new_strategies = []
+  gap = 0.
   for player in range(len(payoff_tensors)):
-    current_payoff_tensor = payoff_tensors[player]
-    current_strategy = strategies[player]
-
-    values_per_strategy = _partial_multi_dot(current_payoff_tensor, strategies,
+    values_per_strategy = _partial_multi_dot(payoff_tensors[player], strategies,
                                              player)
-    average_return = np.dot(values_per_strategy, current_strategy)
-    delta = current_strategy * (values_per_strategy - average_return)
-
-    updated_strategy = current_strategy + dt * delta
-    new_strategies.append(updated_strategy)
-  return new_strategies
+    gap += np.max(values_per_strategy) - np.dot(values_per_strategy,
+                                                strategies[player])
+  return gap
 
 
 def replicator_dynamics(payoff_tensors,
                         prd_initial_strategies=None,
                         prd_iterations=int(1e6),
                         prd_dt=1e-3,
+                        prd_gamma=0.,
                         average_over_last_n_strategies=None,
+                        prd_tolerance=1e-4,
+                        prd_check_every=1000,
+                        return_stats=False,
                         **unused_kwargs):
-  """The Projected Replicator Dynamics algorithm.
+  """The Projected Replicator Dynamics algorithm, with early stopping.
+
+  Strategies are updated in place and averaged with a running sum (or a
+  preallocated ring buffer when averaging over a window), so memory does not
+  grow with the number of iterations. Every prd_check_every steps the
+  exploitability of the average strategy is computed and the solver stops
+  once it is at most prd_tolerance.
 
   Args:
     payoff_tensors: List of payoff tensors for each player.
     prd_initial_strategies: Initial list of the strategies used by each player,
       if any. Could be used to speed up the search by providing a good initial
       solution.
-    prd_iterations: Number of algorithmic steps to take before returning an
-      answer.
+    prd_iterations: Maximum number of algorithmic steps to take before returning
+      an answer, at least 1.
     prd_dt: Update amplitude term.
-    prd_gamma: Minimum exploratory probability term.
+    prd_gamma: Minimum exploratory probability term. Every step is projected
+      back onto the simplex, without which the Euler steps drift off it and
+      eventually diverge.
     average_over_last_n_strategies: Running average window size for average
       policy computation. If None, use the whole trajectory.
+    prd_tolerance: Exploitability at which to stop. None never stops early.
+    prd_check_every: Number of steps between exploitability checks.
+    return_stats: Also return the number of steps taken and the final
+      exploitability.
     **unused_kwargs: Convenient way of exposing an API compatible with other
       methods with possibly different arguments.
 
   Returns:
-    PRD-computed strategies.
+    PRD-computed strategies, followed by the number of iterations and the
+    final exploitability if return_stats.
   """
+  if prd_iterations < 1:
+    raise ValueError("prd_iterations must be at least 1, got {}.".format(
+        prd_iterations))
   number_players = len(payoff_tensors)
   # Number of actions available to each player.
   action_space_shapes = payoff_tensors[0].shape
 
   # If no initial starting position is given, start with uniform probabilities.
-  new_strategies = prd_initial_strategies or [
-      np.ones(action_space_shapes[k]) / action_space_shapes[k]
-      for k in range(number_players)
+  if prd_initial_strategies is None:
+    strategies = [
+        np.ones(action_space_shapes[k]) / action_space_shapes[k]
+        for k in range(number_players)
+    ]
+  else:
+    strategies = [
+        np.array(strategy, dtype=float) for strategy in prd_initial_strategies
+    ]
+
+  window = average_over_last_n_strategies
+  if window is not None and window < prd_iterations:
+    # Ring buffer of the last window strategies of every player.
+    history = [np.zeros((window, len(strategy))) for strategy in strategies]
+  else:
+    window = None
+    history = None
+  running_sum = [np.zeros_like(strategy) for strategy in strategies]
+  values = [None] * number_players
+  # _partial_multi_dot with the transposes taken once, outside the loop.
+  transposed_tensors = [
+      np.transpose(payoff_tensors[player], [player] + [
+          i for i in range(number_players) if i != player
+      ]) for player in range(number_players)
   ]
+  contraction_order = [[
+      i for i in range(number_players - 1, -1, -1) if i != player
+  ] for player in range(number_players)]
 
-  average_over_last_n_strategies = average_over_last_n_strategies or prd_iterations
+  def average(num_steps):
+    if history is not None:
+      count = min(num_steps, window)
+      return [np.sum(h[:count], axis=0) / count for h in history]
+    return [total / num_steps for total in running_sum]
 
-  meta_strategy_window = []
+  gap = None
+  num_steps = 0
   for i in range(prd_iterations):
-    new_strategies = _replicator_dynamics_step(
-        payoff_tensors, new_strategies, prd_dt)
-    if i >= prd_iterations - average_over_last_n_strategies:
-      meta_strategy_window.append(new_strategies)
-  average_new_strategies = np.mean(meta_strategy_window, axis=0)
-  nash_list = [average_new_strategies[i] for i in range(number_players)]
-  # return average_new_strategies
-  return nash_list
+    # All players respond to the strategies of the previous step.
+    for player in range(number_players):
+      accumulator = transposed_tensors[player]
+      for j in contraction_order[player]:
+        accumulator = accumulator.dot(strategies[j])
+      values[player] = accumulator
+    for player in range(number_players):
+      strategy = strategies[player]
+      # strategy += dt * strategy * (values - average_return), in place.
+      values[player] -= values[player].dot(strategy)
+      values[player] *= prd_dt
+      values[player] += 1.
+      strategy *= values[player]
+      # Project back onto the simplex, Euler steps drift off it.
+      if prd_gamma > 0:
+        np.maximum(strategy, prd_gamma, out=strategy)
+      strategy /= strategy.sum()
+      if history is not None:
+        history[player][i % window] = strategy
+      else:
+        running_sum[player] += strategy
+    num_steps = i + 1
+    if (prd_tolerance is not None and num_steps % prd_check_every == 0):
+      gap = _exploitability(payoff_tensors, average(num_steps))
+      if gap <= prd_tolerance:
+        break
+
+  nash_list = average(num_steps)
+  if not return_stats:
+    return nash_list
+  if gap is None or num_steps % prd_check_every != 0:
+    gap = _exploitability(payoff_tensors, nash_list)
+  return nash_list, num_steps, gap
+
+
+def _batched_exploitability(row_payoffs, col_payoffs, row_strategies,
+                            col_strategies, row_masks, col_masks):
+  """Computes the NashConv of a stack of two-player profiles.
+
+  Args:
+    row_payoffs: (B, n, m) payoffs of the row player.
+    col_payoffs: (B, n, m) payoffs of the column player.
+    row_strategies: (B, n) row player strategies, zero outside the support.
+    col_strategies: (B, m) column player strategies, zero outside the support.
+    row_masks: (B, n) support of the row player.
+    col_masks: (B, m) support of the column player.
+
+  Returns:
+    (B,) sum over both players of best response value minus profile value.
+  """
+  row_values = np.matmul(row_payoffs, col_strategies[:, :, None])[:, :, 0]
+  col_values = np.matmul(row_strategies[:, None, :], col_payoffs)[:, 0, :]
+  gap = np.max(np.where(row_masks, row_values, -np.inf), axis=1)
+  gap -= np.sum(row_values * row_strategies, axis=1)
+  gap += np.max(np.where(col_masks, col_values, -np.inf), axis=1)
+  gap -= np.sum(col_values * col_strategies, axis=1)
+  return gap
+
+
+def batched_replicator_dynamics(row_payoffs,
+                                col_payoffs,
+                                row_masks=None,
+                                col_masks=None,
+                                prd_iterations=int(1e6),
+                                prd_dt=1e-3,
+                                prd_gamma=0.,
+                                prd_tolerance=1e-4,
+                                prd_check_every=1000):
+  """Replicator dynamics on a stack of B two-player games at once.
+
+  Games are padded to a common (n, m) shape and masks mark each game's
+  strategies; padded strategies keep probability zero. All games advance
+  together as (B, n) and (B, m) arrays, with the same update, projection and
+  running mean as replicator_dynamics. Every prd_check_every steps the games
+  whose average profile is at most prd_tolerance exploitable are finished and
+  dropped from the working arrays, the others keep going.
+
+  Args:
+    row_payoffs: (B, n, m) payoffs of the row player.
+    col_payoffs: (B, n, m) payoffs of the column player.
+    row_masks: (B, n) booleans, the row player's support in each game. All
+      strategies if None.
+    col_masks: (B, m) booleans, the column player's support in each game. All
+      strategies if None.
+    prd_iterations: Maximum number of steps per game, at least 1.
+    prd_dt: Update amplitude term.
+    prd_gamma: Minimum exploratory probability term inside the support.
+    prd_tolerance: Exploitability at which a game stops. None never stops
+      early.
+    prd_check_every: Number of steps between exploitability checks.
+
+  Returns:
+    A tuple (row_strategies, col_strategies, num_iterations, gaps) of
+    (B, n) and (B, m) average strategies, zero outside the supports, and the
+    (B,) steps taken and final exploitability of each game.
+  """
+  if prd_iterations < 1:
+    raise ValueError("prd_iterations must be at least 1, got {}.".format(
+        prd_iterations))
+  row_payoffs = np.asarray(row_payoffs, dtype=float)
+  col_payoffs = np.asarray(col_payoffs, dtype=float)
+  num_games, n, m = row_payoffs.shape
+  row_masks = (np.ones((num_games, n), dtype=bool) if row_masks is None
+               else np.asarray(row_masks, dtype=bool))
+  col_masks = (np.ones((num_games, m), dtype=bool) if col_masks is None
+               else np.asarray(col_masks, dtype=bool))
+
+  result_rows = np.zeros((num_games, n))
+  result_cols = np.zeros((num_games, m))
+  num_iterations = np.zeros(num_games, dtype=int)
+  gaps = np.zeros(num_games)
+
+  # Working arrays hold the games that are still running.
+  active = np.arange(num_games)
+  rows = row_masks / np.sum(row_masks, axis=1, keepdims=True)
+  cols = col_masks / np.sum(col_masks, axis=1, keepdims=True)
+  row_sum = np.zeros_like(rows)
+  col_sum = np.zeros_like(cols)
+  games = [row_payoffs, col_payoffs, row_masks, col_masks]
+
+  def finish(finished, num_steps):
+    index = active[finished]
+    result_rows[index] = row_sum[finished] / num_steps
+    result_cols[index] = col_sum[finished] / num_steps
+    num_iterations[index] = num_steps
+    return index
+
+  for i in range(prd_iterations):
+    row_values = np.matmul(games[0], cols[:, :, None])[:, :, 0]
+    col_values = np.matmul(rows[:, None, :], games[1])[:, 0, :]
+    # strategy *= 1 + dt * (values - average_return), for both players.
+    row_values -= np.sum(row_values * rows, axis=1, keepdims=True)
+    col_values -= np.sum(col_values * cols, axis=1, keepdims=True)
+    row_values *= prd_dt
+    col_values *= prd_dt
+    row_values += 1.
+    col_values += 1.
+    rows *= row_values
+    cols *= col_values
+    if prd_gamma > 0:
+      rows = np.where(games[2], np.maximum(rows, prd_gamma), 0.)
+      cols = np.where(games[3], np.maximum(cols, prd_gamma), 0.)
+    rows /= np.sum(rows, axis=1, keepdims=True)
+    cols /= np.sum(cols, axis=1, keepdims=True)
+    row_sum += rows
+    col_sum += cols
+
+    num_steps = i + 1
+    if prd_tolerance is not None and num_steps % prd_check_every == 0:
+      gap = _batched_exploitability(games[0], games[1], row_sum / num_steps,
+                                    col_sum / num_steps, games[2], games[3])
+      finished = gap <= prd_tolerance
+      if np.any(finished):
+        gaps[finish(finished, num_steps)] = gap[finished]
+        running = ~finished
+        active = active[running]
+        if len(active) == 0:
+          break
+        games = [game[running] for game in games]
+        rows, cols = rows[running], cols[running]
+        row_sum, col_sum = row_sum[running], col_sum[running]
+
+  if len(active) > 0:
+    finished = np.ones(len(active), dtype=bool)
+    index = finish(finished, num_steps)
+    gaps[index] = _batched_exploitability(
+        games[0], games[1], result_rows[index], result_cols[index], games[2],
+        games[3])
+  return result_rows, result_cols, num_iterations, gaps
@@ -1,5 +1,4 @@
 import subprocess
-import time
 import signal
 import os
 import logging
@@ -18,16 +17,12 @@ def call_and_wait_with_timeout(command_str, timeout):
         logging.info("Process ran more seconds than: " + str(timeout_seconds))
         os.killpg(os.getpgid(my_process.pid), signal.SIGTERM)
         logging.info("Subprocess has been killed.")
-    sleep_sec = 5
-    time.sleep(sleep_sec)
     my_process.kill()
 
 def call_and_wait(command_str):
     logging.info("Will run:\n" + command_str)
     my_process = subprocess.Popen(command_str, shell=True)
     my_process.wait()
-    sleep_sec = 5
-    time.sleep(sleep_sec)
     my_process.kill()
 
 def call_and_wait_with_timeout_and_check(command_str):
@@ -38,6 +33,36 @@ def call_and_wait_with_timeout_and_check(command_str):
         my_process.wait(timeout=timeout_seconds)
     except subprocess.TimeoutExpired:
         logging.info("Process ran more seconds than: " + str(timeout_seconds))
-    sleep_sec = 5
-    time.sleep(sleep_sec)
-    my_process.kill()
\ No newline at end of file
+    my_process.kill()
+
+def call_with_pipes(args, input_str, timeout, cwd=None):
+    """
+    Run a command without a shell, write input_str to its stdin and return its stdout.
+    There is no fixed sleep: the call returns as soon as the process exits.
+    On timeout the process group is killed and whatever was printed so far is returned.
+    :param args: command as a list of strings.
+    :param input_str: text written to stdin.
+    :param timeout: maximum time for the subprocess in seconds.
+    :param cwd: working directory of the subprocess.
+    :return: (stdout, timed_out)
+    """
+    logging.info("Will run:\n" + " ".join(args))
+    my_process = subprocess.Popen(args,
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL,
+                                  cwd=cwd,
+                                  universal_newlines=True,
+                                  start_new_session=True)
+    try:
+        stdout, _ = my_process.communicate(input_str, timeout=timeout)
+        return stdout, False
+    except subprocess.TimeoutExpired:
+        logging.info("Process ran more seconds than: " + str(timeout))
+        try:
+            os.killpg(my_process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        stdout, _ = my_process.communicate()
+        logging.info("Subprocess has been killed.")
+        return stdout, True
\ No newline at end of file
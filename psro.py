@@ -1,15 +1,19 @@
 from meta_strategies import double_oracle, fictitious_play, mrcp_solver
 from game_generator import Game_generator
-from psro_trainer import PSRO_trainer
+from psro_trainer import PSRO_trainer, loop_concurrently
 from utils import set_random_seed
+from game_store import GameStore
+from solution_cache import SolutionCache
+from instrumentation import Recorder, JsonlSink
+from results_store import ResultsWriter
 
 from absl import app
 from absl import flags
 import os
+import json
 import pickle
 import datetime
 import numpy as np
-import pandas as pd
 import functools
 print = functools.partial(print, flush=True)
 
@@ -20,7 +24,15 @@ flags.DEFINE_integer("num_strategies", 100, "The number of rounds starting with
 flags.DEFINE_integer("num_iterations", 40, "The number of rounds starting with different.")
 flags.DEFINE_string("game_type", "zero_sum", "Type of synthetic game.")
 flags.DEFINE_integer("seed",None,"The seed to control randomness.")
-flags.DEFINE_boolean("MRCP_deterministic",True,"mrcp should return a same value given the same empirical game")
+flags.DEFINE_integer("num_workers",1,"Number of processes each trainer plays its rounds in.")
+flags.DEFINE_boolean("concurrent_trainers",False,"Loop the DO, FP and MRCP trainers concurrently over a shared-memory copy of the game.")
+flags.DEFINE_string("game_store",None,"Directory of memory-mapped games to open the game from or generate it into.")
+flags.DEFINE_string("game_name",None,"Name of the game in the game store. Defaults to game_type.")
+flags.DEFINE_boolean("solution_cache",False,"Share solutions of identical restricted games across trainers.")
+flags.DEFINE_string("cache_dir",None,"Directory of the on-disk tier of the solution cache, kept across runs.")
+flags.DEFINE_boolean("stream_results",True,"Stream every iteration's metrics and MRCP profiles to npz shards in <game_type>_<trainer>_results/, readable with results_store.read_frame.")
+flags.DEFINE_boolean("instrument",False,"Write per-iteration phase timings and solver counters of every trainer next to its csv.")
+flags.DEFINE_string("resume",None,"Checkpoint directory of an interrupted run to continue from its trainers' last checkpoints.")
 
 def psro(generator,
          game_type,
@@ -29,13 +41,60 @@ def psro(generator,
          checkpoint_dir,
          meta_method_list=None,
          num_iterations=20,
-         blocks=False):
-    if game_type == "zero_sum":
+         blocks=False,
+         num_workers=1,
+         concurrent_trainers=False,
+         game_store=None,
+         game_name=None,
+         cache=None,
+         instrument=False,
+         stream_results=True,
+         resume=False):
+    """
+    Input:
+        game_store: a GameStore to open the game from or generate it into.
+                    The run then records the game's catalog entry instead of
+                    pickling the whole game.
+        game_name : key of the game in game_store, defaulted to game_type
+        cache     : a SolutionCache shared by the trainers
+        instrument: record phase timings and solver counters of every iteration
+                    to <game_type>_<DO|FP|MRCP>_timings.jsonl in checkpoint_dir
+        stream_results: write metrics and MRCP profiles of every iteration as they are
+                        computed to <game_type>_<DO|FP|MRCP>_results/ in checkpoint_dir,
+                        so that rounds finished before a crash are kept
+        resume    : continue the run in checkpoint_dir. Its game is reloaded and every
+                    trainer resumes from <game_type>_<DO|FP|MRCP>_checkpoint.pkl, which
+                    trainers write after every iteration
+    """
+    if resume:
+        if os.path.exists(checkpoint_dir + game_type + '_meta_games.json'):
+            with open(checkpoint_dir + game_type + '_meta_games.json') as f:
+                entry = json.load(f)
+            game_store, game_name = GameStore(entry['store']), entry['name']
+            meta_games = game_store.open(game_name)
+        else:
+            with open(checkpoint_dir + game_type + '_meta_games.pkl','rb') as f:
+                meta_games = pickle.load(f)
+    elif game_store is not None:
+        game_name = game_type if game_name is None else game_name
+        if game_name in game_store:
+            meta_games = game_store.open(game_name)
+        elif game_type == "zero_sum":
+            meta_games = generator.zero_sum_game(store=game_store, name=game_name)
+        elif game_type == "general_sum":
+            meta_games = generator.general_sum_game(store=game_store, name=game_name)
+        elif game_type == "symmetric_zero_sum":
+            meta_games = generator.symmetric_zero_sum_game(store=game_store, name=game_name)
+        elif os.path.exists('efg_game/'+game_type+'.pkl'):
+            meta_games = game_store.put_pickle(game_name, 'efg_game/'+game_type+'.pkl')
+        else:
+            raise ValueError
+    elif game_type == "zero_sum":
         meta_games = generator.zero_sum_game()
     elif game_type == "general_sum":
         meta_games = generator.general_sum_game()
     elif game_type == "symmetric_zero_sum":
-        meta_games = generator.general_sum_game()
+        meta_games = generator.symmetric_zero_sum_game()
     else:
         for pkl in os.listdir('efg_game'):
             print(pkl)
@@ -50,7 +109,26 @@ def psro(generator,
     # generator.num_strategies = 3
     # num_rounds = 1
     # num_iterations = 10
+
+    # the game goes to disk before any trainer runs, for runs to be resumed
+    if not os.path.exists(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+    if not resume and game_store is None:
+        with open(checkpoint_dir + game_type + '_meta_games.pkl','wb') as f:
+            pickle.dump(meta_games, f)
+    elif not resume:
+        with open(checkpoint_dir + game_type + '_meta_games.json','w') as f:
+            json.dump(dict(game_store.info(game_name), store=os.path.abspath(game_store.root), name=game_name), f)
+
     init_strategies = np.random.randint(0,meta_games[0].shape[0],num_rounds)
+    # the catalog knows whether the game is zero-sum and its smallest payoffs,
+    # which the trainers' solvers would otherwise scan the full game for
+    game_info = None if game_store is None else game_store.info(game_name)
+    recorders = {}
+    writers = {}
+    for name in ['DO', 'FP', 'MRCP']:
+        recorders[name] = Recorder(JsonlSink(checkpoint_dir + game_type + '_' + name + '_timings.jsonl')) if instrument else None
+        writers[name] = ResultsWriter(checkpoint_dir + game_type + '_' + name + '_results') if stream_results else None
 
     DO_trainer = PSRO_trainer(meta_games=meta_games,
                            num_strategies=generator.num_strategies,
@@ -61,7 +139,12 @@ def psro(generator,
                            num_iterations=num_iterations,
                            blocks=blocks,
                            seed=seed,
-                           init_strategies=init_strategies)
+                           init_strategies=init_strategies,
+                           cache=cache,
+                           recorder=recorders['DO'],
+                           results=writers['DO'],
+                           checkpoint_path=checkpoint_dir + game_type + '_DO_checkpoint.pkl',
+                           game_info=game_info)
 
     FP_trainer = PSRO_trainer(meta_games=meta_games,
                            num_strategies=generator.num_strategies,
@@ -72,7 +155,12 @@ def psro(generator,
                            num_iterations=num_iterations,
                            blocks=blocks,
                            seed=seed,
-                           init_strategies=init_strategies)
+                           init_strategies=init_strategies,
+                           cache=cache,
+                           recorder=recorders['FP'],
+                           results=writers['FP'],
+                           checkpoint_path=checkpoint_dir + game_type + '_FP_checkpoint.pkl',
+                           game_info=game_info)
 
     MRCP_trainer = PSRO_trainer(meta_games=meta_games,
                            num_strategies=generator.num_strategies,
@@ -83,8 +171,19 @@ def psro(generator,
                            num_iterations=num_iterations,
                            blocks=blocks,
                            seed=seed,
-                           init_strategies=init_strategies)
+                           init_strategies=init_strategies,
+                           cache=cache,
+                           recorder=recorders['MRCP'],
+                           results=writers['MRCP'],
+                           checkpoint_path=checkpoint_dir + game_type + '_MRCP_checkpoint.pkl',
+                           game_info=game_info)
 
+    for trainer in [DO_trainer, FP_trainer, MRCP_trainer]:
+        if resume:
+            trainer.load(trainer.checkpoint_path)
+        else:
+            # seeds and initial strategies of trainers that have not started yet
+            trainer.save(0, 0)
 
 #    DO_FP_trainer = PSRO_trainer(meta_games=meta_games,
 #                              num_strategies=generator.num_strategies,
@@ -104,14 +203,15 @@ def psro(generator,
 #                              num_iterations=num_iterations,
 #                              blocks=True)
 
-    DO_trainer.loop()
+    if concurrent_trainers:
+        loop_concurrently([DO_trainer, FP_trainer, MRCP_trainer], num_workers=num_workers)
+    else:
+        DO_trainer.loop(num_workers=num_workers)
     print("#####################################")
     print('DO looper finished looping')
     print("#####################################")
-    if not os.path.exists(checkpoint_dir):
-        os.makedirs(checkpoint_dir)
-    with open(checkpoint_dir + game_type + '_meta_games.pkl','wb') as f:
-        pickle.dump(meta_games, f)
+    # pandas takes longer to import than the rest of psro, only pay for it once results are written
+    import pandas as pd
     nashconv_names = ['nashconvs_'+str(t) for t in range(len(DO_trainer.neconvs))]
     mrconv_names = ['mrcpcons_'+str(t) for t in range(len(DO_trainer.mrconvs))]
     df = pd.DataFrame(np.transpose(DO_trainer.neconvs+DO_trainer.mrconvs),\
@@ -120,7 +220,8 @@ def psro(generator,
     with open(checkpoint_dir + game_type + '_mrprofile_DO.pkl','wb') as f:
         pickle.dump(DO_trainer.mrprofiles, f)
 
-    FP_trainer.loop()
+    if not concurrent_trainers:
+        FP_trainer.loop(num_workers=num_workers)
     print("#####################################")
     print('FP looper finished looping')
     print("#####################################")
@@ -130,7 +231,8 @@ def psro(generator,
     with open(checkpoint_dir + game_type + '_mrprofile_FP.pkl','wb') as f:
         pickle.dump(FP_trainer.mrprofiles, f)
 
-    MRCP_trainer.loop()
+    if not concurrent_trainers:
+        MRCP_trainer.loop(num_workers=num_workers)
     print("#####################################")
     print('MRCP looper finished looping')
     print("#####################################")
@@ -151,6 +253,8 @@ def psro(generator,
     print("FP mrcp av:", np.mean(FP_trainer.mrconvs, axis=0))
     print("MR neco av:", np.mean(MRCP_trainer.neconvs, axis=0))
     print("MR mrcp av:", np.mean(MRCP_trainer.mrconvs, axis=0))
+    if cache is not None:
+        print(cache.report())
 
 #    print("DO+FP average:", np.mean(DO_FP_trainer.nashconvs, axis=0))
 #    print("blocks average:", np.mean(blocks_trainer.nashconvs, axis=0))
@@ -162,12 +266,12 @@ def main(argv):
         raise app.UsageError("Too many command-line arguments.")
     
     seed = set_random_seed(FLAGS.seed)
-    if not FLAGS.MRCP_deterministic:
-        seed = None # invalidate the seed so it does not get passed into psro_trainer
 
     generator = Game_generator(FLAGS.num_strategies)
     checkpoint_dir = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')+'_se_'+str(seed)
     checkpoint_dir = os.path.join(os.getcwd(), checkpoint_dir) + '/'
+    if FLAGS.resume is not None:
+        checkpoint_dir = os.path.abspath(FLAGS.resume) + '/'
 
     # game_list = ["zero_sum", "general_sum"]
 
@@ -176,7 +280,15 @@ def main(argv):
          num_rounds=FLAGS.num_rounds,
          seed=seed,
          checkpoint_dir=checkpoint_dir,
-         num_iterations=FLAGS.num_iterations)
+         num_iterations=FLAGS.num_iterations,
+         num_workers=FLAGS.num_workers,
+         concurrent_trainers=FLAGS.concurrent_trainers,
+         game_store=None if FLAGS.game_store is None else GameStore(FLAGS.game_store),
+         game_name=FLAGS.game_name,
+         cache=SolutionCache(cache_dir=FLAGS.cache_dir) if FLAGS.solution_cache or FLAGS.cache_dir else None,
+         instrument=FLAGS.instrument,
+         stream_results=FLAGS.stream_results,
+         resume=FLAGS.resume is not None)
 
 
 if __name__ == "__main__":
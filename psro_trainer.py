@@ -1,8 +1,141 @@
+import gc
+import random
+import threading
 import numpy as np
-from utils import set_random_seed
+from concurrent.futures import Future, ThreadPoolExecutor
+from empirical_game import EmpiricalGame
+import instrumentation
+from checkpoint import save_checkpoint, load_checkpoint
 from exploration import pure_exp
-from meta_strategies import double_oracle
+from meta_strategies import double_oracle, mrcp_solver, IncrementalFictitiousPlay
 from minimum_regret_profile import minimum_regret_profile_calculator
+from nash_solver.general_nash_solver import IncrementalNashSolver
+
+def _attach_trainer(spec, state):
+    """
+    Rebuild a trainer from the state detach_meta_games returned, on meta games
+    attached from shared memory.
+    Output:
+        segments: the attached SharedMemory objects, to be closed once the trainer is dropped
+        trainer : the rebuilt PSRO_trainer
+    """
+    from shared_game import attach_meta_games
+    segments, meta_games = attach_meta_games(spec)
+    trainer = PSRO_trainer.__new__(PSRO_trainer)
+    trainer.__dict__.update(state)
+    trainer.set_meta_games(meta_games)
+    trainer.shared_spec = spec
+    return segments, trainer
+
+def _init_worker(trainer, spec=None):
+    """
+    Keep one copy of the trainer per worker process, so that meta games are
+    sent to each worker once and not with every round. With spec, trainer is
+    the state detach_meta_games returned, and the meta games are attached from
+    shared memory instead of being sent at all.
+    """
+    global _worker_trainer, _worker_segments
+    if spec is not None:
+        # open for the life of the worker
+        _worker_segments, trainer = _attach_trainer(spec, trainer)
+    # the parent checkpoints the rounds workers return
+    trainer.checkpoint_path = None
+    # a forked worker inherits the parent's lookup counters, only its own
+    # lookups go back to the parent
+    _take_cache_counts(trainer)
+    _worker_trainer = trainer
+
+def _take_cache_counts(trainer):
+    return None if trainer.cache is None else trainer.cache.take_counts()
+
+def _merge_cache_counts(trainer, counts):
+    if counts is not None:
+        trainer.cache.merge_counts(counts)
+
+def _play_round(round_index):
+    """
+    Run one round in a worker process and return its results and the lookup
+    counters of the worker's copy of the solution cache.
+    """
+    trainer = _worker_trainer
+    trainer.nashconvs, trainer.neconvs, trainer.mrconvs, trainer.mrprofiles = [], [], [], []
+    trainer.play_round(round_index, 0)
+    return trainer.nashconvs, trainer.neconvs, trainer.mrconvs, trainer.mrprofiles, _take_cache_counts(trainer)
+
+def _loop_on_shared_game(spec, state, num_workers):
+    """
+    Rebuild a trainer on meta games attached from shared memory, loop it and
+    return its results and the lookup counters of its copy of the solution
+    cache.
+    """
+    segments, trainer = _attach_trainer(spec, state)
+    trainer.loop(num_workers=num_workers)
+    results = trainer.nashconvs, trainer.neconvs, trainer.mrconvs, trainer.mrprofiles, _take_cache_counts(trainer)
+    # views into the segments have to be gone before they can be closed
+    del trainer
+    gc.collect()
+    for shm in segments:
+        shm.close()
+    return results
+
+def loop_concurrently(trainers, num_workers=1):
+    """
+    Loop trainers of the same meta games concurrently, each in its own process.
+    The payoff matrices are put in shared memory once and attached by every
+    process, instead of pickling the full game to each of them. Solution caches
+    get a disk tier, through which the processes share solutions, and the
+    lookups of every process are counted in the trainers' caches.
+    Input:
+        trainers   : PSRO_trainers built on the same meta games
+        num_workers: number of processes each trainer plays its rounds in
+    """
+    # process pools and shared memory are only imported when used, they add
+    # to the startup of every job otherwise
+    from concurrent.futures import ProcessPoolExecutor
+    from shared_game import SharedMetaGames
+    for trainer in trainers:
+        if trainer.cache is not None:
+            trainer.cache.share_on_disk()
+    with SharedMetaGames(trainers[0].meta_games) as shared:
+        with ProcessPoolExecutor(max_workers=len(trainers)) as executor:
+            futures = [executor.submit(_loop_on_shared_game,
+                                       shared.spec,
+                                       trainer.detach_meta_games(),
+                                       num_workers) for trainer in trainers]
+            for trainer, future in zip(trainers, futures):
+                trainer.nashconvs, trainer.neconvs, trainer.mrconvs, trainer.mrprofiles, counts = future.result()
+                _merge_cache_counts(trainer, counts)
+
+# attributes handed to the trainer rather than owned by it, load keeps the
+# trainer's own
+_NOT_CHECKPOINTED = ['cache', 'recorder', 'results', 'checkpoint_path', 'shared_spec']
+
+class _Metric(object):
+    """
+    A call of one of the trainer's metric methods, as kept in a checkpoint in
+    place of its future: its result once it has run, its arguments until then,
+    for the resumed trainer to submit it again.
+    """
+    def __init__(self, name, args, order):
+        self.name = name
+        self.args = args
+        self.order = order
+        self.done = False
+        self.result = None
+
+def _pack(entries):
+    return [ele.metric if isinstance(ele, Future) else ele for ele in entries]
+
+def _unpack(entries):
+    unpacked = []
+    for ele in entries:
+        if isinstance(ele, _Metric) and ele.done:
+            future = Future()
+            future.set_result(ele.result)
+            future.metric = ele
+            ele = future
+        unpacked.append(ele)
+    return unpacked
 
 class PSRO_trainer(object):
     def __init__(self, meta_games,
@@ -16,24 +149,46 @@ class PSRO_trainer(object):
                  seed=None,
                  calculate_neconv=True,
                  calculate_mrcpconv=True,
-                 init_strategies=None):
+                 init_strategies=None,
+                 cache=None,
+                 async_metrics=True,
+                 recorder=None,
+                 results=None,
+                 checkpoint_path=None,
+                 checkpoint_every=1,
+                 game_info=None):
         """
         Inputs:
             num_rounds      : repeat psro on matrix games from #num_rounds start points
             meta_method_list: for heuristics block switching
             blocks          : HBS
-            seed            : a integer. If provided, reset every round to guarantee that mrcp calculation is deterministic given an empirical game:
+            seed            : a integer. Every round draws from its own generator, spawned from this seed (or from one draw of np.random without it); rounds never re-seed the global np.random:
             calculate_neconv   : ne_conv to evaluate to evaluate the heuristics
             calculate_mrcpconv : mrcp_conv to evaluate the heuristics
             init_strategies    : a len(num_rounds) list or a number
+            cache              : a SolutionCache of restricted game solutions, may be shared across trainers
+            async_metrics      : evaluate neconv and mrconv on a background thread, off the path of
+                                 strategy generation. Ignored with meta_method_list, whose methods
+                                 share solvers with the metrics.
+            recorder           : an instrumentation.Recorder that gets one record of phase times and
+                                 solver counters per iteration. Metrics are then evaluated synchronously,
+                                 so that their time and counters are charged to the right iteration.
+            results            : a results_store.ResultsWriter that every metric value and MRCP profile
+                                 is streamed to as soon as it is known, flushed after every iteration
+            checkpoint_path    : file the trainer state is saved to every checkpoint_every iterations
+                                 and after every round, see load. Metrics in flight are not waited
+                                 for, the checkpoint keeps their inputs and load submits them again.
+            game_info          : GameStore catalog entry of meta_games. Its zero_sum flag and payoff
+                                 minimums spare the solvers a scan of the full game.
         """
-        self.meta_games = meta_games
+        self.cache = cache
+        self.game_info = {} if game_info is None else game_info
+        self.set_meta_games(meta_games)
         self.num_rounds = num_rounds
         self.meta_method = meta_method
         self.num_strategies = num_strategies
         self.checkpoint_dir = checkpoint_dir
         self.meta_method_list = meta_method_list
-        self.mrcp_calculator = minimum_regret_profile_calculator(full_game=meta_games)
         self.mode = 0
         self.blocks = blocks
         self.seed = seed
@@ -46,8 +201,27 @@ class PSRO_trainer(object):
         else:
             self.init_strategies = np.random.randint(0, num_strategies, num_rounds)
 
-        self.empirical_games = [[], []]
+        self.empirical_games = EmpiricalGame(np.shape(meta_games[0])[0])
         self.num_iterations = num_iterations
+        self._round_seeds = None
+        self.rng = None  # generator of the current round, from its round seed
+        self.async_metrics = async_metrics
+        self._metric_executor = None
+        # held by the metric thread while a metric runs, so checkpoints see
+        # the metric solvers between two metrics
+        self._metric_lock = None
+        self._metrics_submitted = 0
+        self.recorder = recorder
+        self.results = results
+        self._round = None
+        self._solver_counts = (0, 0, 0)
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        # SharedMetaGames.spec of meta_games when they are attached from shared memory
+        self.shared_spec = None
+        # lists of the round being played, and where a loaded checkpoint resumes
+        self._round_lists = None
+        self._resume = None
 
         self.fast_period = 1
         self.slow_period = 1
@@ -58,11 +232,43 @@ class PSRO_trainer(object):
         self.mrconvs = []
         self.mrprofiles = []
 
+    def set_meta_games(self, meta_games):
+        """
+        Attach the full game and the solvers built on top of it.
+        """
+        self.meta_games = meta_games
+        self.mrcp_calculator = minimum_regret_profile_calculator(full_game=meta_games,
+                                                                 cache=self.cache,
+                                                                 zero_sum=self.game_info.get('zero_sum'))
+        # warm-started NE solver shared by double_oracle calls of a round
+        self.nash_solver = IncrementalNashSolver(meta_games,
+                                                 payoff_min=self.game_info.get('payoff_min'),
+                                                 zero_sum=self.game_info.get('zero_sum'))
+        # running payoff sums of fictitious_play over a round
+        self.fp_solver = IncrementalFictitiousPlay(meta_games)
+
+    def detach_meta_games(self):
+        """
+        Return the trainer state without the full game, small enough to be
+        pickled to another process. set_meta_games restores a trainer from it.
+        """
+        state = dict(self.__dict__)
+        for key in ['meta_games', 'mrcp_calculator', 'nash_solver', 'fp_solver']:
+            del state[key]
+        return state
+
     def init_round(self,init_strategy):
         #init_strategy = np.random.randint(0, self.num_strategies)
         #init_strategy = 0
-        self.empirical_games = [[init_strategy], [init_strategy]]
+        self.empirical_games = EmpiricalGame(np.shape(self.meta_games[0])[0],
+                                             [init_strategy, init_strategy],
+                                             meta_games=self.meta_games)
         self.mode = 0
+        # rounds are independent: start every round from the same meta method
+        if self.meta_method_list is not None:
+            self.meta_method = self.meta_method_list[0]
+        self.fast_count = self.fast_period
+        self.slow_count = self.slow_period
 
         if self.blocks:
             nash_payoff = self.meta_games[init_strategy, init_strategy]
@@ -72,102 +278,405 @@ class PSRO_trainer(object):
                                      2,
                                      slow_period=self.slow_period,
                                      fast_period=self.fast_period,
-                                     abs_value=True)
+                                     abs_value=True,
+                                     rng=self.rng)
             self.selector.arm_pulled = 0
 
-    def iteration(self):
-        nashconv_list = []
-        neconv_list = []
-        mrconv_list = []
-        mrprofile_list = []
+    def meta_step(self):
+        """
+        Call the current meta method, handing double_oracle and fictitious_play the round's
+        incremental solvers and the solution cache to the methods that solve restricted games.
+        """
+        if self.meta_method.__name__=='double_oracle':
+            return self.meta_method(self.meta_games, self.empirical_games, self.checkpoint_dir, nash_solver=self.nash_solver, cache=self.cache)
+        if self.meta_method.__name__=='mrcp_solver':
+            return self.meta_method(self.meta_games, self.empirical_games, self.checkpoint_dir, cache=self.cache, zero_sum=self.game_info.get('zero_sum'))
+        if self.meta_method.__name__=='fictitious_play':
+            return self.meta_method(self.meta_games, self.empirical_games, self.checkpoint_dir, fp_solver=self.fp_solver)
+        return self.meta_method(self.meta_games, self.empirical_games, self.checkpoint_dir)
+
+    def record(self, iteration):
+        """
+        Emit the phase times and counters of an iteration, with the warm and
+        cold starts and pivots of the round's nash_solver since the last record.
+        """
+        if self.recorder is None:
+            return
+        solver_counts = (self.nash_solver.warm_starts, self.nash_solver.cold_starts, self.nash_solver.num_pivots)
+        for name, now, before in zip(['nash_warm_starts', 'nash_cold_starts', 'nash_pivots'], solver_counts, self._solver_counts):
+            if now > before:
+                self.recorder.count(name, now - before)
+        self._solver_counts = solver_counts
+        self.recorder.emit(round=self._round,
+                           iteration=iteration,
+                           meta_method=self.meta_method.__name__,
+                           support_sizes=[len(self.empirical_games.support(player)) for player in range(2)])
+
+    def collect(self, values, metric, entry, profile=None, support=None):
+        """
+        Append a metric value, or a Future of it, to a list of the round and
+        stream it to the results writer once it is known.
+        Input:
+            values : the round's list of the metric
+            metric : name of the metric, see results_store.METRICS
+            entry  : the value, or a Future of (profile or strategies, value[, support])
+            profile: optional MRCP profile of the value, on support
+        """
+        if self.results is not None:
+            if isinstance(entry, Future):
+                self.stream(entry, self._round, metric, len(values))
+            else:
+                self.results.append(self._round, metric, len(values), entry, profile, support)
+        values.append(entry)
+
+    def stream(self, future, round_index, metric, index):
+        """
+        Write the value of a metric future to the results writer once it is known.
+        """
+        def write(future):
+            if future.exception() is not None:
+                return
+            result = future.result()
+            if len(result) == 3:
+                self.results.append(round_index, metric, index, result[1], result[0], result[2])
+            else:
+                self.results.append(round_index, metric, index, result[1])
+        future.add_done_callback(write)
+
+    def ne_metric(self, empirical_games):
+        """
+        NE of the empirical game, by double_oracle on the round's nash_solver.
+        """
+        return double_oracle(self.meta_games, empirical_games, self.checkpoint_dir, nash_solver=self.nash_solver, cache=self.cache)
+
+    def mrcp_metric(self, empirical_games):
+        """
+        MRCP of the empirical game with the support the profile is on.
+        """
+        profile, value = self.mrcp_calculator(empirical_games)
+        return profile, value, self.mrcp_calculator.mrcp_empirical_game
+
+    def flush_results(self):
+        if self.results is not None:
+            self.results.flush()
+
+    def shared(self):
+        """
+        Objects checkpoints refer to instead of copying, load resolves them to
+        the loading trainer's own.
+        """
+        return {'cache': self.cache, 'recorder': self.recorder, 'results': self.results}
+
+    def save(self, next_round, next_iteration):
+        """
+        Checkpoint the trainer to checkpoint_path, to resume at next_iteration
+        of round next_round. Besides the trainer's attributes (empirical game,
+        metric lists, mrcp calculator, nash solver, HBS selector, ...) this
+        keeps the random state and mrcp_solver's calculator. The full game is
+        not written, load takes it from the trainer it loads into, and neither
+        are the solution cache, recorder, results writer and checkpoint path,
+        which may be shared with other trainers.
+        """
+        state = dict(self.__dict__)
+        for key in _NOT_CHECKPOINTED:
+            del state[key]
+        state['_metric_executor'] = None
+        state['_metric_lock'] = None
+        methods = [self.meta_method] if self.meta_method_list is None else self.meta_method_list
+        uses_mrcp_solver = mrcp_solver in methods and hasattr(mrcp_solver, 'mrcp_calculator')
+        state['_resume'] = (next_round,
+                            next_iteration,
+                            (np.random.get_state(), random.getstate()),
+                            mrcp_solver.mrcp_calculator if uses_mrcp_solver else None)
+        # metrics still queued are kept as calls, and the metric solvers as
+        # they are before the first of them
+        if self._metric_lock is not None:
+            self._metric_lock.acquire()
+        try:
+            if self._round_lists is not None:
+                state['_round_lists'] = {key: _pack(entries) for key, entries in self._round_lists.items()}
+            # rows of metrics that finished since the iteration's flush go to
+            # disk with the checkpoint that records them as done
+            self.flush_results()
+            save_checkpoint(self.checkpoint_path, state, self.meta_games, self.shared())
+        finally:
+            if self._metric_lock is not None:
+                self._metric_lock.release()
+
+    def load(self, path):
+        """
+        Restore the trainer from a checkpoint of a trainer on the same meta
+        games. The next loop continues from the last checkpointed iteration,
+        with the random state and mrcp_solver's calculator of that moment. The
+        trainer keeps its own solution cache, recorder, results writer and
+        checkpoint path.
+        """
+        state = load_checkpoint(path, self.meta_games, self.shared())
+        if state['_round_lists'] is not None:
+            state['_round_lists'] = {key: _unpack(entries) for key, entries in state['_round_lists'].items()}
+        self.__dict__.update(state)
+
+    def checkpoint(self, it):
+        """
+        Checkpoint after iteration it of the current round, if one is due.
+        """
+        if self.checkpoint_path is not None and (it + 1) % self.checkpoint_every == 0:
+            self.save(self._round, it + 1)
+
+    def evaluate(self, metric, *args):
+        """
+        Evaluate a metric on the metric thread, or right away if metrics are
+        synchronous. Metrics run one at a time in submission order, so stateful
+        evaluators (the round's nash_solver and mrcp_calculator) see the same
+        calls as in a synchronous run.
+        Input:
+            metric: one of the trainer's metric methods, ne_metric or mrcp_metric
+            args  : its arguments, kept by checkpoints taken before it has run
+        Output:
+            a Future of the metric's return value
+        """
+        call = _Metric(metric.__name__, args, self._metrics_submitted)
+        self._metrics_submitted += 1
+        if self._metric_executor is not None:
+            future = self._metric_executor.submit(self._run_metric, call)
+        else:
+            future = Future()
+            future.set_result(self._run_metric(call))
+        future.metric = call
+        return future
+
+    def _run_metric(self, call):
+        if self._metric_lock is not None:
+            self._metric_lock.acquire()
+        try:
+            call.result = getattr(self, call.name)(*call.args)
+            call.done = True
+            call.args = None
+        finally:
+            if self._metric_lock is not None:
+                self._metric_lock.release()
+        return call.result
+
+    def resubmit_metrics(self):
+        """
+        Submit again, in their original order, the metrics of the round that
+        had not run when the loaded checkpoint was taken, and stream the values
+        of all metric futures of the round again. A metric that finished while
+        the checkpoint was taken may have its row in neither, the results
+        readers keep the last row of every value.
+        """
+        calls = {}
+        for entries in self._round_lists.values():
+            for ele in entries:
+                if isinstance(ele, _Metric):
+                    calls[id(ele)] = ele
+        futures = {}
+        for call in sorted(calls.values(), key=lambda call: call.order):
+            futures[id(call)] = self.evaluate(getattr(self, call.name), *call.args)
+        for metric, entries in self._round_lists.items():
+            for index, ele in enumerate(entries):
+                if isinstance(ele, _Metric):
+                    entries[index] = futures[id(ele)]
+                if self.results is not None and metric != 'mrprofile' and isinstance(entries[index], Future):
+                    self.stream(entries[index], self._round, metric, index)
+
+    def snapshot(self):
+        """
+        Copy of the empirical game, as the trainer keeps adding strategies to it.
+        """
+        return self.empirical_games.copy()
+
+    def iteration(self, start=0):
+        if self.async_metrics and self.meta_method_list is None and self.recorder is None:
+            self._metric_executor = ThreadPoolExecutor(max_workers=1)
+            self._metric_lock = threading.Lock()
+        try:
+            self._iteration(start)
+        finally:
+            if self._metric_executor is not None:
+                self._metric_executor.shutdown(wait=True)
+                self._metric_executor = None
+                self._metric_lock = None
+
+    def _iteration(self, start=0):
+        """
+        Play the iterations of a round from start on. A round resumed at start > 0
+        continues the lists restored by load.
+        """
+        if start == 0:
+            self._round_lists = {'nashconv': [], 'neconv': [], 'mrconv': [], 'mrprofile': []}
+        else:
+            self.resubmit_metrics()
+        nashconv_list = self._round_lists['nashconv']
+        neconv_list = self._round_lists['neconv']
+        mrconv_list = self._round_lists['mrconv']
+        mrprofile_list = self._round_lists['mrprofile']
 
         # Tricky Detail: mrcp does not calculate NE's first empirical game's mrcp value
         # ne does not calculate mrcp's first empirical game's NE-based regret
-        if self.calculate_mrconv:
+        if start == 0 and self.calculate_mrconv:
             if self.meta_method.__name__!='mrcp_solver':
-                mrcp_profile, mrcp_value = self.mrcp_calculator(self.empirical_games)
-                mrconv_list.append(mrcp_value)
-                mrprofile_list.append(mrcp_profile)
-        if self.meta_method.__name__!='double_oracle':
-            _, neconv = double_oracle(self.meta_games,self.empirical_games,self.checkpoint_dir)
-            neconv_list.append(neconv)
-
-        for it in range(self.num_iterations):
+                with instrumentation.phase('mrconv'):
+                    mrcp = self.evaluate(self.mrcp_metric, self.snapshot())
+                self.collect(mrconv_list, 'mrconv', mrcp)
+                mrprofile_list.append(mrcp)
+        if start == 0 and self.meta_method.__name__!='double_oracle':
+            with instrumentation.phase('neconv'):
+                ne = self.evaluate(self.ne_metric, self.snapshot())
+            self.collect(neconv_list, 'neconv', ne)
+
+        for it in range(start, self.num_iterations):
             print('##################Iteration {}###############'.format(it))
-            dev_strs, nashconv = self.meta_method(self.meta_games, self.empirical_games, self.checkpoint_dir)
-            nashconv_list.append(nashconv)
-            self.empirical_games[0].append(dev_strs[0])
-            self.empirical_games[0] = sorted(self.empirical_games[0])
-            self.empirical_games[1].append(dev_strs[1])
-            self.empirical_games[1] = sorted(self.empirical_games[1])
+            with instrumentation.phase('meta_strategy'):
+                dev_strs, nashconv = self.meta_step()
+            self.collect(nashconv_list, 'nashconv', nashconv)
+            self.empirical_games.add(0, dev_strs[0])
+            self.empirical_games.add(1, dev_strs[1])
             if self.meta_method_list is not None:
                 self.mode = 1 - self.mode
                 self.meta_method = self.meta_method_list[self.mode]
 
             if self.calculate_neconv:
                 if self.meta_method.__name__!='double_oracle':
-                    _, neconv = double_oracle(self.meta_games,
-                                              self.empirical_games,
-                                              self.checkpoint_dir)
-                    neconv_list.append(neconv)
+                    with instrumentation.phase('neconv'):
+                        ne = self.evaluate(self.ne_metric, self.snapshot())
+                    self.collect(neconv_list, 'neconv', ne)
                 else:
-                    neconv_list.append(nashconv) 
+                    self.collect(neconv_list, 'neconv', nashconv)
 
             if self.calculate_mrconv:
                 if self.meta_method.__name__!='mrcp_solver':
-                    mrcp_profile, mrcp_value = self.mrcp_calculator(self.empirical_games)
-                    mrconv_list.append(mrcp_value)
-                    mrprofile_list.append(mrcp_profile)
+                    with instrumentation.phase('mrconv'):
+                        mrcp = self.evaluate(self.mrcp_metric, self.snapshot())
+                    self.collect(mrconv_list, 'mrconv', mrcp)
+                    mrprofile_list.append(mrcp)
                 else:
-                    mrconv_list.append(nashconv)
-                    mrprofile_list.append(self.meta_method.mrcp_calculator.mrcp_profile)
+                    calculator = self.meta_method.mrcp_calculator
+                    self.collect(mrconv_list, 'mrconv', nashconv, calculator.mrcp_profile, calculator.mrcp_empirical_game)
+                    mrprofile_list.append(calculator.mrcp_profile)
+            self.record(it)
+            self.flush_results()
+            self.checkpoint(it)
         
         # Tricky part: Nashconv does not add the last value after update
         # mrcp does not add its last own value after its last update
         # NE does not add its last own value after its last update
-        _,nashconv = self.meta_method(self.meta_games,self.empirical_games,self.checkpoint_dir)
-        nashconv_list.append(nashconv)
+        with instrumentation.phase('meta_strategy'):
+            _,nashconv = self.meta_step()
+        self.record(self.num_iterations)
+        self.collect(nashconv_list, 'nashconv', nashconv)
         if self.meta_method.__name__=='mrcp_solver':
-            mrconv_list.append(nashconv)
-            mrprofile_list.append(self.meta_method.mrcp_calculator.mrcp_profile)
+            calculator = self.meta_method.mrcp_calculator
+            self.collect(mrconv_list, 'mrconv', nashconv, calculator.mrcp_profile, calculator.mrcp_empirical_game)
+            mrprofile_list.append(calculator.mrcp_profile)
         if self.meta_method.__name__=='double_oracle':
-            neconv_list.append(nashconv)
-        
+            self.collect(neconv_list, 'neconv', nashconv)
+
+        # metrics were evaluated as futures of (profile or strategies, value)
         self.nashconvs.append(nashconv_list)
-        self.mrconvs.append(mrconv_list)
-        self.mrprofiles.append(mrprofile_list)
-        self.neconvs.append(neconv_list)
+        self.mrconvs.append([ele.result()[1] if isinstance(ele, Future) else ele for ele in mrconv_list])
+        self.mrprofiles.append([ele.result()[0] if isinstance(ele, Future) else ele for ele in mrprofile_list])
+        self.neconvs.append([ele.result()[1] if isinstance(ele, Future) else ele for ele in neconv_list])
+        self._round_lists = None
 
-    def loop(self):
-        for i in range(self.num_rounds):
+    def round_seeds(self, seed):
+        """
+        One deterministic seed per round, spawned from seed.
+        """
+        return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(self.num_rounds)]
+
+    def play_round(self, i, start=0):
+        """
+        Play round i, or resume it at iteration start from a loaded checkpoint.
+        """
+        if start == 0:
+            # randomness of the round comes from its own stream, the global
+            # np.random is not touched
+            self.rng = np.random.default_rng(self._round_seeds[i])
             self.init_round(self.init_strategies[i])
-            # reset to same random seed to guarantee MRCP
-            # being deterministic given empirical game
-            if self.seed is not None:
-                set_random_seed(self.seed) 
+            self._round = i
+            self._solver_counts = (0, 0, 0)
+        with instrumentation.recording(self.recorder):
             if self.blocks:
-                self.iteration_blocks()
+                self.iteration_blocks(start)
             else:
-                self.iteration()
+                self.iteration(start)
+        # metrics still in flight at the last iteration's flush
+        self.flush_results()
+
+        self.mrcp_calculator.clear()
+        self.nash_solver.clear()
+        self.fp_solver.clear()
+        if self.checkpoint_path is not None:
+            self.save(i + 1, 0)
+
+    def loop(self, num_workers=1):
+        """
+        Input:
+            num_workers: number of processes to play rounds in. Results are
+                         merged in round order and, given a seed, are identical
+                         to a serial loop. The solution cache then gets a disk
+                         tier to be shared through, see SolutionCache.share_on_disk.
+        """
+        if self._resume is None:
+            self._round_seeds = None
+            first_round, start = 0, 0
+        else:
+            first_round, start, random_state, mrcp_solver_calculator = self._resume
+            self._resume = None
+            np.random.set_state(random_state[0])
+            random.setstate(random_state[1])
+            if mrcp_solver_calculator is not None:
+                mrcp_solver.mrcp_calculator = mrcp_solver_calculator
+        if self._round_seeds is None:
+            # without a seed, the round seeds still come from one draw, so that
+            # serial and parallel loops play the same rounds
+            self._round_seeds = self.round_seeds(self.seed if self.seed is not None else np.random.randint(2**31))
+        if start > 0:
+            # finish the interrupted round first
+            self.play_round(first_round, start)
+            first_round += 1
+        if num_workers <= 1 or self.num_rounds - first_round <= 1:
+            for i in range(first_round, self.num_rounds):
+                self.play_round(i)
+            return
 
-            self.mrcp_calculator.clear()
+        from concurrent.futures import ProcessPoolExecutor
+        if self.cache is not None:
+            self.cache.share_on_disk()
+        # meta games in shared memory are attached by the workers, not pickled to them
+        initargs = (self,) if self.shared_spec is None else (self.detach_meta_games(), self.shared_spec)
+        with ProcessPoolExecutor(max_workers=num_workers,
+                                 initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            rounds = range(first_round, self.num_rounds)
+            for i, (nashconvs, neconvs, mrconvs, mrprofiles, counts) in zip(rounds, executor.map(_play_round, rounds)):
+                _merge_cache_counts(self, counts)
+                self.nashconvs += nashconvs
+                self.neconvs += neconvs
+                self.mrconvs += mrconvs
+                self.mrprofiles += mrprofiles
+                if self.checkpoint_path is not None:
+                    self.save(i + 1, 0)
 
     # For blocks
-    def iteration_blocks(self):
-        nashconv_list = []
-        for _ in range(self.num_iterations):
-            dev_strs, nashconv = self.meta_method(self.meta_games, self.empirical_games, self.checkpoint_dir)
+    def iteration_blocks(self, start=0):
+        if start == 0:
+            self._round_lists = {'nashconv': []}
+        nashconv_list = self._round_lists['nashconv']
+        for it in range(start, self.num_iterations):
+            with instrumentation.phase('meta_strategy'):
+                dev_strs, nashconv = self.meta_step()
             if nashconv is not None:
-                nashconv_list.append(nashconv)
+                self.collect(nashconv_list, 'nashconv', nashconv)
                 if not self.mode:
                     self.blocks_nashconv.append(nashconv)
             else:
-                _, nashconv = double_oracle(self.meta_games, self.empirical_games, self.checkpoint_dir)
-                nashconv_list.append(nashconv)
-            self.empirical_games[0].append(dev_strs[0])
-            self.empirical_games[0] = sorted(self.empirical_games[0])
-            self.empirical_games[1].append(dev_strs[1])
-            self.empirical_games[1] = sorted(self.empirical_games[1])
+                with instrumentation.phase('neconv'):
+                    _, nashconv = double_oracle(self.meta_games, self.empirical_games, self.checkpoint_dir, nash_solver=self.nash_solver, cache=self.cache)
+                self.collect(nashconv_list, 'nashconv', nashconv)
+            self.empirical_games.add(0, dev_strs[0])
+            self.empirical_games.add(1, dev_strs[1])
             if self.meta_method_list is not None:
                 if self.mode:
                     self.fast_count -= 1
@@ -183,3 +692,7 @@ class PSRO_trainer(object):
                         self.selector.update_weights(self.blocks_nashconv[-2]-self.blocks_nashconv[-1])
                         next_method = self.selector.sample(self.num_iterations)
                         self.meta_method = self.meta_method_list[next_method]
+            self.record(it)
+            self.flush_results()
+            self.checkpoint(it)
+        self._round_lists = None
@@ -0,0 +1,218 @@
+import os
+import glob
+import threading
+import numpy as np
+
+"""
+This script streams PSRO results to disk while trainers run. Every metric value
+of every iteration is one row, MRCP profiles are stored sparsely as the support
+strategies and their probabilities, and rows are written in .npz shards as they
+come in, so a run that dies keeps everything up to its last flushed iteration.
+read_frame rebuilds the DataFrame psro.py writes as csv, read_profiles the
+mrprofile pickles.
+"""
+
+METRICS = ('nashconv', 'neconv', 'mrconv')
+
+
+class ResultsWriter(object):
+    """
+    Append-only writer of metric rows into a directory of .npz shards.
+    """
+    def __init__(self, directory, shard_rows=4096):
+        """
+        Input:
+            directory : where shards are written, created on the first flush
+            shard_rows: rows buffered before a shard is written without an
+                        explicit flush
+        """
+        self.directory = directory
+        self.shard_rows = shard_rows
+        self._num_shards = 0
+        self._clear()
+        # metric futures append from the trainer's metric thread
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # copies sent to other processes start with an empty buffer
+        state = dict(self.__dict__)
+        del state['_lock']
+        for key in ['_rows', '_profile_rows', '_profile_players', '_profile_strategies', '_profile_probs']:
+            state[key] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _clear(self):
+        self._rows = []
+        self._profile_rows = []
+        self._profile_players = []
+        self._profile_strategies = []
+        self._profile_probs = []
+
+    def append(self, round_index, metric, index, value, profile=None, support=None):
+        """
+        Input:
+            round_index: round of the trainer
+            metric     : one of METRICS
+            index      : position of the value in the round's list of the metric
+            value      : the metric value
+            profile    : optional, a probability vector per player, aligned with support
+            support    : the sorted strategies of every player the profile is on
+        """
+        with self._lock:
+            row = len(self._rows)
+            self._rows.append((round_index, METRICS.index(metric), index, value))
+            if profile is not None:
+                for player, (strategies, probs) in enumerate(zip(support, profile)):
+                    self._profile_rows += [row] * len(probs)
+                    self._profile_players += [player] * len(probs)
+                    self._profile_strategies += list(strategies)
+                    self._profile_probs += list(probs)
+            if len(self._rows) >= self.shard_rows:
+                self._write_shard()
+
+    def flush(self):
+        with self._lock:
+            if self._rows:
+                self._write_shard()
+
+    def _write_shard(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        rounds, metrics, indices, values = zip(*self._rows)
+        # process id in the name, rounds may be written by several worker processes
+        path = os.path.join(self.directory, 'shard_{}_{:06d}.npz'.format(os.getpid(), self._num_shards))
+        tmp = path + '.tmp.npz'
+        np.savez(tmp,
+                 round=np.array(rounds, dtype=np.int32),
+                 metric=np.array(metrics, dtype=np.int8),
+                 index=np.array(indices, dtype=np.int32),
+                 value=np.array(values, dtype=float),
+                 profile_row=np.array(self._profile_rows, dtype=np.int32),
+                 profile_player=np.array(self._profile_players, dtype=np.int8),
+                 profile_strategy=np.array(self._profile_strategies, dtype=np.int32),
+                 profile_prob=np.array(self._profile_probs, dtype=float))
+        os.replace(tmp, path)
+        self._num_shards += 1
+        self._clear()
+
+
+def read_shards(directory):
+    """
+    Concatenate all shards of a directory.
+    Output:
+        a dict of columns, profile_row indexing into the concatenated rows
+    """
+    columns = {}
+    offset = 0
+    # in the order they were written
+    for path in sorted(glob.glob(os.path.join(directory, 'shard_*.npz')), key=lambda path: (os.path.getmtime(path), path)):
+        if path.endswith('.tmp.npz'):
+            continue
+        with np.load(path) as shard:
+            for key in shard.files:
+                column = shard[key] + offset if key == 'profile_row' else shard[key]
+                columns.setdefault(key, []).append(column)
+            offset += len(shard['round'])
+    return {key: np.concatenate(column) for key, column in columns.items()}
+
+def _metric_rows(columns, metric):
+    """
+    Rows of metric, the last one written of each (round, index): a resumed run
+    writes the iterations after its checkpoint again.
+    """
+    rows = np.flatnonzero(columns['metric'] == METRICS.index(metric))
+    keys = columns['round'][rows].astype(np.int64) * (2**31) + columns['index'][rows]
+    _, last = np.unique(keys[::-1], return_index=True)
+    return np.sort(rows[::-1][last])
+
+def read_metric(directory, metric, columns=None):
+    """
+    Output:
+        a list per round of the metric's values, in list order, as the trainer keeps them
+    """
+    columns = read_shards(directory) if columns is None else columns
+    if not columns:
+        return []
+    rows = _metric_rows(columns, metric)
+    rounds = columns['round'][rows]
+    values = []
+    for round_index in range(int(rounds.max()) + 1 if len(rows) else 0):
+        round_rows = rows[rounds == round_index]
+        round_rows = round_rows[np.argsort(columns['index'][round_rows], kind='stable')]
+        values.append(columns['value'][round_rows].tolist())
+    return values
+
+def read_frame(directory):
+    """
+    The DataFrame psro.py writes as <game_type>_<trainer>.csv: one column of
+    NE-based regrets per round followed by one column of MRCP values per round.
+    """
+    import pandas as pd
+    columns = read_shards(directory)
+    neconvs = read_metric(directory, 'neconv', columns)
+    mrconvs = read_metric(directory, 'mrconv', columns)
+    nashconv_names = ['nashconvs_'+str(t) for t in range(len(neconvs))]
+    mrconv_names = ['mrcpcons_'+str(t) for t in range(len(mrconvs))]
+    return pd.DataFrame(np.transpose(neconvs+mrconvs), columns=nashconv_names+mrconv_names)
+
+def read_profiles(directory):
+    """
+    MRCP profiles of every round, like the trainer's mrprofiles: a list per
+    round of [probabilities of player 0, probabilities of player 1], each on
+    the player's sorted support.
+    """
+    columns = read_shards(directory)
+    if not columns:
+        return []
+    rows = _metric_rows(columns, 'mrconv')
+    profile_row = columns['profile_row']
+    order = np.argsort(profile_row, kind='stable')
+    starts = np.searchsorted(profile_row[order], rows, side='left')
+    ends = np.searchsorted(profile_row[order], rows, side='right')
+    profiles = {}
+    for row, start, end in zip(rows, starts, ends):
+        entries = order[start:end]
+        players = columns['profile_player'][entries]
+        profile = []
+        for player in range(int(players.max()) + 1 if len(entries) else 0):
+            player_entries = entries[players == player]
+            player_entries = player_entries[np.argsort(columns['profile_strategy'][player_entries], kind='stable')]
+            profile.append(columns['profile_prob'][player_entries])
+        profiles[(int(columns['round'][row]), int(columns['index'][row]))] = profile
+    if not profiles:
+        return []
+    return [[profiles[key] for key in sorted(profiles) if key[0] == round_index]
+            for round_index in range(max(key[0] for key in profiles) + 1)]
+
+def read_profile_stack(directory, num_strategies):
+    """
+    MRCP profiles of every round as full-length stacks, to be scored at once
+    with the kernels module, e.g. kernels.nashconv(meta_games, probs).
+    Input:
+        num_strategies: number of strategies of every player in the full game
+    Output:
+        keys : a (P, 2) array of the (round, index) of every profile, in order
+        probs: a (P, num_strategies[i]) stack per player
+    """
+    columns = read_shards(directory)
+    if not columns:
+        return np.zeros((0, 2), dtype=int), [np.zeros((0, num)) for num in num_strategies]
+    rows = _metric_rows(columns, 'mrconv')
+    rows = rows[np.isin(rows, columns['profile_row'])]
+    rows = rows[np.lexsort((columns['index'][rows], columns['round'][rows]))]
+    keys = np.stack([columns['round'][rows], columns['index'][rows]], axis=-1)
+    # position in the stack of every row, -1 for rows left out
+    position = np.full(len(columns['round']), -1)
+    position[rows] = np.arange(len(rows))
+    stack_row = position[columns['profile_row']]
+    probs = []
+    for player, num in enumerate(num_strategies):
+        entries = np.flatnonzero((stack_row >= 0) & (columns['profile_player'] == player))
+        prob = np.zeros((len(rows), num))
+        prob[stack_row[entries], columns['profile_strategy'][entries]] = columns['profile_prob'][entries]
+        probs.append(prob)
+    return keys, probs
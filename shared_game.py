@@ -0,0 +1,58 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+"""
+This script places the payoff matrices of a meta game in shared memory, so
+that worker processes attach them zero-copy instead of receiving a pickled
+copy of the full game each.
+"""
+
+class SharedMetaGames(object):
+    """
+    Owner of the shared copy of meta_games. The segments are unlinked on close,
+    so workers must be finished with the game by then.
+    """
+    def __init__(self, meta_games):
+        """
+        Input:
+            meta_games: a list of payoff matrices, one per player
+        """
+        self._segments = []
+        self.spec = []
+        for meta_game in meta_games:
+            meta_game = np.asarray(meta_game)
+            shm = shared_memory.SharedMemory(create=True, size=max(meta_game.nbytes, 1))
+            np.ndarray(meta_game.shape, dtype=meta_game.dtype, buffer=shm.buf)[...] = meta_game
+            self._segments.append(shm)
+            self.spec.append((shm.name, meta_game.shape, meta_game.dtype.str))
+
+    def close(self):
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_meta_games(spec):
+    """
+    Attach meta games put in shared memory by SharedMetaGames.
+    Input:
+        spec: SharedMetaGames.spec, a list of (name, shape, dtype) per player
+    Output:
+        segments  : the attached SharedMemory objects, to be closed once the views are dropped
+        meta_games: read-only payoff matrices backed by shared memory
+    """
+    segments, meta_games = [], []
+    for name, shape, dtype in spec:
+        shm = shared_memory.SharedMemory(name=name)
+        meta_game = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        meta_game.flags.writeable = False
+        segments.append(shm)
+        meta_games.append(meta_game)
+    return segments, meta_games
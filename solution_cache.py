@@ -0,0 +1,171 @@
+import os
+import copy
+import pickle
+import threading
+import hashlib
+import tempfile
+import collections
+from game_store import content_hash
+import instrumentation
+
+"""
+This script caches solutions of restricted games, so that trainers of the same
+full game, and runs over the same stored game, do not solve an identical
+restricted game twice. Keys are (kind, full game content hash, sorted strategy
+sets); values are whatever the solver returns, e.g. an NE or an MRCP with its value.
+"""
+
+class SolutionCache(object):
+    """
+    LRU cache in memory with an optional pickle-per-entry tier on disk.
+    """
+    def __init__(self, capacity=4096, cache_dir=None):
+        """
+        Input:
+            capacity : number of solutions kept in memory
+            cache_dir: directory of the disk tier, which survives across runs.
+                       Memory only if None.
+        """
+        self.capacity = capacity
+        self.cache_dir = cache_dir
+        self._tmp_dir = None  # disk tier made by share_on_disk, removed with the cache
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._entries = collections.OrderedDict()
+        # id of player 0's payoff matrix -> (the matrix, its content hash).
+        # The matrix is held so that the id is not reused by another game.
+        self._game_hashes = {}
+        self.hits = collections.Counter()
+        self.disk_hits = collections.Counter()
+        self.misses = collections.Counter()
+        # trainers look up solutions from their metric thread as well
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # a copy sent to another process keeps only the disk tier, the memory
+        # tier holds references to full games. The copy counts its own
+        # lookups, for take_counts and merge_counts to bring them back.
+        state = dict(self.__dict__)
+        state['_entries'] = collections.OrderedDict()
+        state['_game_hashes'] = {}
+        state['_tmp_dir'] = None
+        state['hits'] = collections.Counter()
+        state['disk_hits'] = collections.Counter()
+        state['misses'] = collections.Counter()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def game_hash(self, meta_games):
+        if id(meta_games[0]) not in self._game_hashes:
+            self._game_hashes[id(meta_games[0])] = (meta_games[0], content_hash(meta_games))
+        return self._game_hashes[id(meta_games[0])][1]
+
+    def key(self, kind, meta_games, empirical_games, context=()):
+        """
+        context: anything hashable the solution depends on besides the
+                 restricted game, e.g. the state of a warm-started solver
+        """
+        return (kind, self.game_hash(meta_games)) + tuple(tuple(sorted(set(int(s) for s in ele))) for ele in empirical_games) + tuple(context)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.pkl')
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, kind, meta_games, empirical_games, context=()):
+        """
+        Output:
+            a copy of the cached solution, None on a miss
+        """
+        with self._lock:
+            key = self.key(kind, meta_games, empirical_games, context)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits[kind] += 1
+                instrumentation.count('cache_hits')
+                return copy.deepcopy(self._entries[key])
+            if self.cache_dir is not None and os.path.exists(self._path(key)):
+                with open(self._path(key), 'rb') as f:
+                    value = pickle.load(f)
+                self._remember(key, value)
+                self.hits[kind] += 1
+                self.disk_hits[kind] += 1
+                instrumentation.count('cache_hits')
+                return copy.deepcopy(value)
+            self.misses[kind] += 1
+            instrumentation.count('cache_misses')
+            return None
+
+    def put(self, kind, meta_games, empirical_games, value, context=()):
+        with self._lock:
+            key = self.key(kind, meta_games, empirical_games, context)
+            value = copy.deepcopy(value)
+            self._remember(key, value)
+            if self.cache_dir is not None:
+                self._write(key, value)
+
+    def _write(self, key, value):
+        path = self._path(key)
+        # per-process temporary name, runs may share the directory
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(tmp, path)
+
+    def share_on_disk(self):
+        """
+        Make sure the cache has a disk tier, call before copies of it are sent
+        to other processes, which share solutions only through the disk tier.
+        Without a cache_dir, a temporary directory removed with the cache is
+        used and the solutions in memory are written to it.
+        """
+        with self._lock:
+            if self.cache_dir is not None:
+                return
+            self._tmp_dir = tempfile.TemporaryDirectory(prefix='solution_cache_')
+            self.cache_dir = self._tmp_dir.name
+            for key, value in self._entries.items():
+                self._write(key, value)
+
+    def take_counts(self):
+        """
+        Lookup counters of a copy of the cache in another process, reset so
+        that every lookup is handed to merge_counts once.
+        """
+        with self._lock:
+            counts = self.hits, self.disk_hits, self.misses
+            self.hits, self.disk_hits, self.misses = collections.Counter(), collections.Counter(), collections.Counter()
+            return counts
+
+    def merge_counts(self, counts):
+        """
+        Add the lookup counters take_counts returned in another process.
+        """
+        hits, disk_hits, misses = counts
+        with self._lock:
+            self.hits.update(hits)
+            self.disk_hits.update(disk_hits)
+            self.misses.update(misses)
+
+    def hit_rates(self):
+        """
+        Output:
+            {kind: fraction of lookups answered from the cache}
+        """
+        kinds = set(self.hits) | set(self.misses)
+        return {kind: self.hits[kind] / (self.hits[kind] + self.misses[kind]) for kind in kinds}
+
+    def report(self):
+        lines = []
+        for kind, rate in sorted(self.hit_rates().items()):
+            lines.append('{} cache: {} hits ({} from disk), {} misses, hit rate {:.3f}'.format(
+                kind, self.hits[kind], self.disk_hits[kind], self.misses[kind], rate))
+        return '\n'.join(lines)
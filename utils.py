@@ -1,6 +1,6 @@
 import numpy as np
 import random
-from open_spiel.python.algorithms.psro_v2 import meta_strategies
+import kernels
 
 def set_random_seed(seed=None):
     seed = np.random.randint(low=0,high=1e5) if seed is None else seed
@@ -9,6 +9,20 @@ def set_random_seed(seed=None):
     return seed
 
 
+def partial_payoff(payoff_tensor, probs, player):
+    """
+    Expected payoff of each strategy of player against the other players'
+    mixed strategies, see kernels.partial_payoffs. The joint probability
+    tensor is never built, memory stays within the size of payoff_tensor.
+    Input:
+        payoff_tensor: payoff of one player, one axis per player
+        probs        : mixed strategy of every player, matching payoff_tensor's shape
+        player       : the player whose axis is kept
+    Output:
+        a vector of length payoff_tensor.shape[player]
+    """
+    return kernels.partial_payoffs(payoff_tensor, probs, player)
+
 def mixed_strategy_payoff(meta_games, probs):
     """
     A multiple player version of mixed strategy payoff writen below by yongzhao
@@ -17,13 +31,8 @@ def mixed_strategy_payoff(meta_games, probs):
     assert len(meta_games)==len(probs),'number of player not equal'
     for i in range(len(meta_games)):
         assert len(probs[i]) <= meta_games[0].shape[i],'meta game should have larger dimension than marginal probability vector'
-    prob_matrix = meta_strategies.general_get_joint_strategy_from_marginals(probs)
-    prob_slice = tuple([slice(prob_matrix.shape[i]) for i in range(len(meta_games))])
-    meta_game_copy = [ele[prob_slice] for ele in meta_games]
-    payoffs = []
-    for i in range(len(meta_games)):
-        payoffs.append(np.sum(meta_game_copy[i]*prob_matrix))
-    return payoffs
+    prob_slice = tuple([slice(len(probs[i])) for i in range(len(meta_games))])
+    return list(kernels.expected_payoffs([meta_game[prob_slice] for meta_game in meta_games], probs))
 
 # This older version of function must be of two players
 #def mixed_strategy_payoff(meta_games, probs):
@@ -37,47 +46,62 @@ def mixed_strategy_payoff(meta_games, probs):
 
 def regret_of_variable(prob_var, empirical_games, meta_game):
     """
-    Only works for two player case
     Calculate the function value of one data point prob_var
     in amoeba method, Reshape and expand the probability var into full shape
     Input:
         prob_var       : variable that amoeba directly search over
         empirical_games: a list of list, indicating player's strategy sets
         meta_game      : the full game matrix to calculate deviation from
+    prob_var may also be a (R, n) stack, then R regrets are returned.
     """
     probs = []
     index = np.cumsum([len(ele) for ele in empirical_games])
     pointer = 0
     for i, idx in enumerate(empirical_games):
-        prob = np.zeros(meta_game[0].shape[i])
-        np.put(prob, idx, prob_var[pointer:index[i]])
+        prob = np.zeros(np.shape(prob_var)[:-1] + (meta_game[0].shape[i],))
+        prob[..., idx] = prob_var[..., pointer:index[i]]
         pointer = index[i]
         probs.append(prob)
 
-    _, dev_payoff = deviation_strategy(meta_game,probs) 
-    payoff = mixed_strategy_payoff(meta_game, probs)
-    return sum(dev_payoff)-sum(payoff)
-
+    return kernels.nashconv(meta_game, probs)
 
-def deviation_strategy(meta_games, probs):
-    dev_strs = []
-    dev_payoff = []
-    prob1 = probs[0]
-    prob1 = np.reshape(prob1, newshape=(len(prob1), 1))
-    prob2 = probs[1]
 
-    payoff_vec = np.sum(meta_games[0] * prob2, axis=1)
-    payoff_vec = np.reshape(payoff_vec, -1)
-    idx = np.argmax(payoff_vec)
-    dev_strs.append(idx)
-    dev_payoff.append(payoff_vec[idx])
-
-    payoff_vec = np.sum(prob1 * meta_games[1], axis=0)
-    payoff_vec = np.reshape(payoff_vec, -1)
-    idx = np.argmax(payoff_vec)
-    dev_strs.append(idx)
-    dev_payoff.append(payoff_vec[idx])
+def regret_objective(empirical_games, meta_game):
+    """
+    Only works for two player case
+    Build a function equal to regret_of_variable for a fixed support. The
+    full_game[:, support] and full_game[support, :] slices are taken once,
+    so every evaluation costs O(N*k) for the best responses and O(k^2) for
+    the profile payoff, without expanding prob_var to full length.
+    Input:
+        empirical_games: a list of list, indicating player's strategy sets
+        meta_game      : the full game matrix to calculate deviation from
+    Output:
+        a function of prob_var, the variable that amoeba directly search over.
+        prob_var may also be a (R, n) stack, then R regrets are returned.
+    """
+    support0, support1 = [np.array(ele, dtype=int) for ele in empirical_games]
+    k0 = len(support0)
+    dev_payoff0 = meta_game[0][:, support1]   # N x k1, player 0's deviations
+    dev_payoff1 = meta_game[1][support0, :]   # k0 x N, player 1's deviations
+    profile_payoff = dev_payoff0[support0, :] + dev_payoff1[:, support1]  # k0 x k1, summed over players
 
-    return dev_strs, dev_payoff
+    def regret(prob_var):
+        prob0, prob1 = prob_var[..., :k0], prob_var[..., k0:]
+        return np.max(np.dot(prob1, dev_payoff0.T), axis=-1) + np.max(np.dot(prob0, dev_payoff1), axis=-1) \
+                - np.sum(np.dot(prob0, profile_payoff) * prob1, axis=-1)
+    return regret
 
 
+def deviation_strategy(meta_games, probs):
+    """
+    Best response of every player to the others' mixed strategies.
+    Input:
+        meta_games: payoff tensors of all players, one axis per player
+        probs     : full length mixed strategy of every player
+    Output:
+        dev_strs  : best response strategy of every player
+        dev_payoff: payoff of each best response
+    """
+    dev_strs, dev_payoff = kernels.best_responses(meta_games, probs)
+    return list(dev_strs), list(dev_payoff)